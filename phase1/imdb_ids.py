@@ -0,0 +1,60 @@
+import re
+
+"""
+CSCI-620: Project
+
+Integer encoding of the IMDb identifiers. tconst (tt0000001) and nconst
+(nm0000001) are zero-padded decimal numbers behind a two letter prefix, so
+the number alone identifies the title or artist and fits in an INTEGER
+column. Used by the loaders (--int-keys), the collaboration engine and the
+Phase 3 mining scripts to keep keys, indexes and in-memory transactions
+small.
+
+"""
+
+# Largest value of a PostgreSQL INTEGER column
+MAX_ID = 2 ** 31 - 1
+
+# IMDb identifiers have at least 7 digits
+ID_DIGITS = 7
+
+_id_pattern = re.compile(r'(tt|nm)(\d+)')
+
+
+def encode_id(identifier, prefix):
+    # Already encoded, e.g. read back from an --int-keys database
+    if isinstance(identifier, int) and not isinstance(identifier, bool):
+        return identifier
+    match = _id_pattern.fullmatch(identifier) if isinstance(identifier, str) else None
+    if match is None or match.group(1) != prefix:
+        raise ValueError(f"Malformed {prefix} identifier: {identifier!r}")
+    digits = match.group(2)
+    # Reject identifiers that would not decode back to the same string
+    if len(digits) < ID_DIGITS or (len(digits) > ID_DIGITS and digits[0] == '0'):
+        raise ValueError(f"Malformed {prefix} identifier: {identifier!r}")
+    value = int(digits)
+    if value > MAX_ID:
+        raise ValueError(f"{prefix} identifier out of INTEGER range: {identifier!r}")
+    return value
+
+
+def decode_id(value, prefix):
+    return f"{prefix}{value:0{ID_DIGITS}d}"
+
+
+# tt0000001 -> 1
+def encode_tconst(tconst):
+    return encode_id(tconst, 'tt')
+
+
+# nm0000001 -> 1
+def encode_nconst(nconst):
+    return encode_id(nconst, 'nm')
+
+
+def decode_tconst(value):
+    return decode_id(value, 'tt')
+
+
+def decode_nconst(value):
+    return decode_id(value, 'nm')
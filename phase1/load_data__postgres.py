@@ -1,5 +1,14 @@
 import psycopg2
-import csv
+from psycopg2.extras import execute_values
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from resumable_tsv import (Checkpoints, checkpoint_key, read_tsv_rows,
+                           split_byte_ranges)
+from imdb_ids import encode_nconst, encode_tconst
+import argparse
+import functools
+import multiprocessing
+import os
+import re
 import time
 
 """
@@ -9,44 +18,390 @@ This program is used to load the data into the database for Project Phase 1
 
 """
 
-# Database connection
-connection = psycopg2.connect(
-    dbname="project",
-    user="postgres",
-    password="admin",
-    host="localhost",
-    port="5432"
-)
-cursor = connection.cursor()
+# Database connection parameters
+db_params = {
+    'dbname': 'project',
+    'user': 'postgres',
+    'password': 'admin',
+    'host': 'localhost',
+    'port': '5432'
+}
+
+# Opened by connect() so that the loaders can be imported without a database
+connection = None
+cursor = None
+
+# Set by open_checkpoints() when the load records its progress
+checkpoints = None
+
+# Number of characters handed to COPY per read() call
+COPY_BUFFER_SIZE = 1 << 16
+
+# Defaults for the batched insert mode
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_COMMIT_EVERY = 10  # batches per commit
+
+# Rows per COPY statement, each followed by a commit and a checkpoint
+DEFAULT_COPY_ROWS_PER_COMMIT = 1000000
+
+DEFAULT_CHECKPOINT_DIR = 'checkpoints/postgres'
+
+# Row mode commits and checkpoints after this many rows or seconds,
+# whichever comes first
+ROW_MODE_COMMIT_ROWS = 10000
+ROW_MODE_COMMIT_SECONDS = 5
+
+# Schema of the tables, created by the loader in --int-keys mode
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'SQL_tables.txt')
+
+
+def connect():
+    global connection, cursor
+    connection = psycopg2.connect(**db_params)
+    cursor = connection.cursor()
+
+
+def open_checkpoints(directory, clear=False):
+    global checkpoints
+    checkpoints = Checkpoints(directory)
+    if clear:
+        checkpoints.clear()
+
+
+# Initializer of the parallel load workers
+def init_worker(checkpoint_dir=None):
+    connect()
+    if checkpoint_dir:
+        open_checkpoints(checkpoint_dir)
+
+
+# Returns the byte offset to read from and the number of rows already
+# committed for a table or byte range
+def resume_position(key, start):
+    if checkpoints is None:
+        return start, 0
+    offset, row_num, _ = checkpoints.position(key, start)
+    return offset, row_num
+
+
+def save_checkpoint(key, offset, row_num, done=False):
+    if checkpoints is not None:
+        checkpoints.save(key, offset, row_num, done)
+
+
+# Commits the row mode inserts and saves their checkpoint every
+# ROW_MODE_COMMIT_ROWS rows or ROW_MODE_COMMIT_SECONDS seconds, instead of
+# after every row
+class RowCommitter:
+    def __init__(self, key):
+        self.key = key
+        self.rows = 0
+        self.last_commit = time.time()
+        self.offset = None
+        self.row_num = None
+
+    def row_done(self, offset, row_num):
+        self.offset, self.row_num = offset, row_num
+        self.rows += 1
+        if (self.rows >= ROW_MODE_COMMIT_ROWS
+                or time.time() - self.last_commit >= ROW_MODE_COMMIT_SECONDS):
+            self.commit()
+
+    def commit(self):
+        connection.commit()
+        if self.offset is not None:
+            save_checkpoint(self.key, self.offset, self.row_num)
+        self.rows = 0
+        self.last_commit = time.time()
+
+
+# Runs the inserts of one row inside a savepoint, so that a failing row is
+# rolled back on its own without losing the uncommitted rows before it
+def insert_row(query, records):
+    cursor.execute("SAVEPOINT row_insert")
+    try:
+        for record in records:
+            cursor.execute(query, record)
+    except psycopg2.Error:
+        cursor.execute("ROLLBACK TO SAVEPOINT row_insert")
+        raise
+    finally:
+        cursor.execute("RELEASE SAVEPOINT row_insert")
+
+
+def describe_source(tsv_file, start=None, end=None):
+    if start is None and end is None:
+        return tsv_file
+    return f"{tsv_file} (bytes {start or 0}-{end if end is not None else 'EOF'})"
 
 
 # Function to insert data from TSV files
-def insert_data_from_tsv(table_name, tsv_file, query, process_row_func):
+def insert_data_from_tsv(table_name, tsv_file, query, process_row_func,
+                         start=None, end=None):
     start_time = time.time()
-    with open(tsv_file, 'r', encoding='utf-8') as f:  # Read plain TSV file
-        reader = csv.reader(f, delimiter='\t')
-        next(reader)  # Skip the header row
-        for row_num, row in enumerate(reader, start=1):
+    key = checkpoint_key(table_name, start)
+    offset, first_row = resume_position(key, start)
+    committer = RowCommitter(key)
+    with open(tsv_file, 'rb') as f:  # Read plain TSV file
+        for row_num, row, offset in read_tsv_rows(f, offset, end, first_row):
             try:
                 data = process_row_func(row)
 
                 # Check if process_row_func returned a list of tuples
                 if isinstance(data, list):
-                    for record in data:  # Insert each tuple in the list
-                        cursor.execute(query, record)
+                    insert_row(query, data)  # Insert each tuple in the list
                 elif data:  # Single record (tuple)
-                    cursor.execute(query, data)
+                    insert_row(query, [data])
 
+            except (ValueError, IndexError) as e:
+                print(f"Skipping row {row_num} of {table_name}: {e}")
             except psycopg2.Error as e:
                 print(
                     f"Error inserting into {table_name} at row {row_num}: {e}")
-                connection.rollback()
-            else:
-                connection.commit()
+            committer.row_done(offset, row_num)
+    committer.commit()
     end_time = time.time()
     elapsed_minutes = (end_time - start_time) / 60  # Convert seconds to minutes
     print(
-        f"Completed loading {table_name} from {tsv_file}. Time taken: {elapsed_minutes:.2f} minutes.")
+        f"Completed loading {table_name} from {describe_source(tsv_file, start, end)}. Time taken: {elapsed_minutes:.2f} minutes.")
+
+
+# Formats a single value in PostgreSQL COPY text format
+def format_copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+# File-like object that converts TSV rows with a process_*_row function and
+# hands them to cursor.copy_expert as COPY text lines. Each COPY statement
+# receives at most rows_per_segment rows; start_segment() begins the next one.
+class CopyStream:
+    def __init__(self, table_name, rows, process_row_func,
+                 rows_per_segment=None):
+        self.table_name = table_name
+        self.rows = rows  # iterator of (row_num, row, offset)
+        self.process_row_func = process_row_func
+        self.rows_per_segment = rows_per_segment
+        self.segment_rows = 0
+        self.segment_records = 0
+        self.pending = ''
+        self.exhausted = False
+        self.row_num = 0
+        self.offset = None
+
+    def start_segment(self):
+        self.segment_rows = 0
+        self.segment_records = 0
+
+    def next_lines(self):
+        if self.rows_per_segment and self.segment_rows >= self.rows_per_segment:
+            return None
+        for row_num, row, offset in self.rows:
+            self.row_num, self.offset = row_num, offset
+            self.segment_rows += 1
+            try:
+                data = self.process_row_func(row)
+            except (ValueError, IndexError) as e:
+                print(f"Skipping row {row_num} of {self.table_name}: {e}")
+                continue
+            if not data:
+                continue
+            records = data if isinstance(data, list) else [data]
+            self.segment_records += len(records)
+            return ''.join(
+                '\t'.join(format_copy_value(value) for value in record) + '\n'
+                for record in records)
+        self.exhausted = True
+        return None
+
+    def read(self, size=-1):
+        parts = [self.pending]
+        length = len(self.pending)
+        while size < 0 or length < size:
+            lines = self.next_lines()
+            if lines is None:
+                break
+            parts.append(lines)
+            length += len(lines)
+        data = ''.join(parts)
+        if size < 0:
+            self.pending = ''
+            return data
+        self.pending = data[size:]
+        return data[:size]
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+# Extracts "Table (col1, col2, ...)" from an INSERT query so COPY targets the
+# same columns as the row-by-row loader
+def copy_target(query):
+    match = re.search(r'INSERT INTO\s+(\w+\s*\([^)]*\))\s+VALUES', query)
+    if match is None:
+        raise ValueError(f"Cannot derive a COPY target from query: {query}")
+    return match.group(1)
+
+
+# Inserts the rows of the byte range [start, end) of a TSV file through
+# insert_batch, so that only the rows that really fail are skipped. Used to
+# load a COPY segment again after it was rolled back. Returns the number of
+# inserted and of failed rows, without committing.
+def reinsert_rows(table_name, tsv_file, query, process_row_func, start, end,
+                  first_row):
+    statement, template = values_template(query)
+    batch = []
+    inserted = 0
+    record_count = 0
+    with open(tsv_file, 'rb') as f:
+        for row_num, row, _ in read_tsv_rows(f, start, end, first_row):
+            try:
+                data = process_row_func(row)
+            except (ValueError, IndexError):
+                continue  # Already reported while copying
+            if not data:
+                continue
+            for record in (data if isinstance(data, list) else [data]):
+                batch.append((row_num, record))
+                record_count += 1
+            if len(batch) >= DEFAULT_BATCH_SIZE:
+                inserted += insert_batch(table_name, statement, template, batch)
+                batch = []
+    if batch:
+        inserted += insert_batch(table_name, statement, template, batch)
+    return inserted, record_count - inserted
+
+
+# Function to bulk load data from TSV files with COPY ... FROM STDIN,
+# committing every rows_per_commit rows
+def copy_data_from_tsv(table_name, tsv_file, query, process_row_func,
+                       start=None, end=None,
+                       rows_per_commit=DEFAULT_COPY_ROWS_PER_COMMIT):
+    start_time = time.time()
+    copy_query = f"COPY {copy_target(query)} FROM STDIN"
+    key = checkpoint_key(table_name, start)
+    offset, row_num = resume_position(key, start)
+    inserted = 0
+    skipped = 0
+    with open(tsv_file, 'rb') as f:
+        stream = CopyStream(table_name,
+                            read_tsv_rows(f, offset, end, row_num),
+                            process_row_func, rows_per_commit)
+        while not stream.exhausted:
+            stream.start_segment()
+            try:
+                cursor.copy_expert(copy_query, stream, size=COPY_BUFFER_SIZE)
+            except psycopg2.Error as e:
+                # COPY is all-or-nothing, the whole segment is rolled back and
+                # loaded again row by row, skipping only the failing rows
+                print(f"Error copying into {table_name} between rows {row_num + 1} "
+                      f"and {stream.row_num}, retrying them in batches: {e}")
+                connection.rollback()
+                while stream.read(COPY_BUFFER_SIZE):
+                    pass  # Move to the end of the segment if COPY stopped early
+                segment_inserted, segment_failed = reinsert_rows(
+                    table_name, tsv_file, query, process_row_func, offset,
+                    stream.offset, row_num)
+                inserted += segment_inserted
+                skipped += segment_failed
+            else:
+                inserted += stream.segment_records
+            connection.commit()
+            if stream.offset is not None:
+                offset, row_num = stream.offset, stream.row_num
+                save_checkpoint(key, offset, row_num)
+    elapsed_seconds = time.time() - start_time
+    rows_per_second = inserted / elapsed_seconds if elapsed_seconds else 0
+    print(
+        f"Completed loading {table_name} from {describe_source(tsv_file, start, end)}. Time taken: {elapsed_seconds / 60:.2f} minutes "
+        f"({inserted} rows, {skipped} skipped, {rows_per_second:.0f} rows/sec).")
+
+
+# Splits "INSERT ... VALUES (%s, ...)" into the statement and the per-row
+# template expected by execute_values
+def values_template(query):
+    statement, template = query.rsplit('VALUES', 1)
+    return statement + 'VALUES %s', template.strip()
+
+
+# Inserts a batch of (row_num, record) pairs inside a savepoint. When the
+# batch fails it is bisected, so only the rows that really fail are logged
+# and skipped while the rest of the batch is still loaded.
+def insert_batch(table_name, statement, template, batch):
+    cursor.execute("SAVEPOINT batch_insert")
+    try:
+        execute_values(cursor, statement, [record for _, record in batch],
+                       template=template, page_size=len(batch))
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT batch_insert")
+        cursor.execute("RELEASE SAVEPOINT batch_insert")
+        if len(batch) == 1:
+            print(f"Error inserting into {table_name} at row {batch[0][0]}: {e}")
+            return 0
+        middle = len(batch) // 2
+        return (insert_batch(table_name, statement, template, batch[:middle]) +
+                insert_batch(table_name, statement, template, batch[middle:]))
+    cursor.execute("RELEASE SAVEPOINT batch_insert")
+    return len(batch)
+
+
+# Function to insert data from TSV files in batches with execute_values,
+# committing every commit_every batches
+def batch_insert_from_tsv(table_name, tsv_file, query, process_row_func,
+                          batch_size=DEFAULT_BATCH_SIZE,
+                          commit_every=DEFAULT_COMMIT_EVERY,
+                          start=None, end=None):
+    start_time = time.time()
+    statement, template = values_template(query)
+    key = checkpoint_key(table_name, start)
+    offset, row_num = resume_position(key, start)
+    batch = []
+    batches_since_commit = 0
+    inserted = 0
+    record_count = 0
+
+    def commit():
+        nonlocal batches_since_commit
+        connection.commit()
+        batches_since_commit = 0
+        if offset is not None:
+            save_checkpoint(key, offset, row_num)
+
+    def flush():
+        nonlocal batch, batches_since_commit, inserted
+        if batch:
+            inserted += insert_batch(table_name, statement, template, batch)
+            batch = []
+            batches_since_commit += 1
+        if batches_since_commit >= commit_every:
+            commit()
+
+    with open(tsv_file, 'rb') as f:
+        for row_num, row, offset in read_tsv_rows(f, offset, end, row_num):
+            try:
+                data = process_row_func(row)
+            except (ValueError, IndexError) as e:
+                print(f"Skipping row {row_num} of {table_name}: {e}")
+                continue
+            if not data:
+                continue
+            for record in (data if isinstance(data, list) else [data]):
+                batch.append((row_num, record))
+                record_count += 1
+            if len(batch) >= batch_size:
+                flush()
+    flush()
+    commit()
+    elapsed_seconds = time.time() - start_time
+    rows_per_second = inserted / elapsed_seconds if elapsed_seconds else 0
+    print(
+        f"Completed loading {table_name} from {describe_source(tsv_file, start, end)}. Time taken: {elapsed_seconds / 60:.2f} minutes "
+        f"({inserted} rows, {record_count - inserted} skipped, {rows_per_second:.0f} rows/sec).")
 
 
 # Processing functions for each table
@@ -123,62 +478,477 @@ artist_known_insert_query = """INSERT INTO Artist_Known (nconst, tconst)
 
 genre_insert_query = """INSERT INTO Genre (genreName) VALUES (%s) ON CONFLICT (genreName) DO NOTHING"""
 
-# Load data into tables
-insert_data_from_tsv('Artist', 'data/name.basics.tsv', artist_insert_query,
-                     process_artist_row)
-insert_data_from_tsv('Title', 'data/title.basics.tsv', title_insert_query,
-                     process_title_row)
-insert_data_from_tsv('Principals', 'data/title.principals.tsv',
-                     principal_insert_query, process_principal_row)
-insert_data_from_tsv('Rating', 'data/title.ratings.tsv', rating_insert_query,
-                     process_rating_row)
-insert_data_from_tsv('Title_Akas', 'data/title.akas.tsv', akas_insert_query,
-                     process_title_akas_row)
-
-
-# Insert genres first and then insert Title_Genre relationships
-def insert_genres_and_title_genres():
+# Used with the in-memory genre name -> GenreID map
+genre_bulk_insert_query = """INSERT INTO Genre (genreName) VALUES %s ON CONFLICT (genreName) DO NOTHING"""
+
+title_genre_id_insert_query = """INSERT INTO Title_Genre (tconst, GenreID) 
+                                 VALUES (%s, %s)"""
+
+# Insert genres first and then insert Title_Genre relationships. Resumes
+# from the Title_Genre checkpoint, so that a rerun does not insert the
+# relationships again.
+def insert_genres_and_title_genres(int_keys=False):
     start_time = time.time()  # Start time
-    with open('data/title.basics.tsv', 'r',
-              encoding='utf-8') as f:  # Read plain TSV file
-        reader = csv.reader(f, delimiter='\t')
-        next(reader)  # Skip header
-        for row_num, row in enumerate(reader, start=1):
+    key = checkpoint_key('Title_Genre')
+    offset, first_row = resume_position(key, None)
+    committer = RowCommitter(key)
+    with open('data/title.basics.tsv', 'rb') as f:  # Read plain TSV file
+        for row_num, row, offset in read_tsv_rows(f, offset, None, first_row):
             # Ensure the row has at least 9 elements to account for data
             # inconsistencies
             if len(row) < 9:
                 print(f"Skipping row {row_num}: Row has fewer than 9 columns.")
+                committer.row_done(offset, row_num)
                 continue  # Skip rows with insufficient data
 
+            try:
+                tconst = encode_tconst(row[0]) if int_keys else row[0]
+            except ValueError as e:
+                print(f"Skipping row {row_num} of Title_Genre: {e}")
+                committer.row_done(offset, row_num)
+                continue
+
             # Get the genres column, or use an empty list if it's missing or null
             genres = row[8].split(",") if row[8] != '\\N' else []
             for genre in genres:
                 try:
                     # Insert the genre into the Genre table
-                    cursor.execute(genre_insert_query, (genre.strip(),))
+                    insert_row(genre_insert_query, [(genre.strip(),)])
                     # Insert into the Title_Genre table
-                    cursor.execute(title_genre_insert_query,
-                                   (row[0], genre.strip()))
+                    insert_row(title_genre_insert_query,
+                               [(tconst, genre.strip())])
                 except psycopg2.Error as e:
                     print(
                         f"Error inserting into Genre or Title_Genre at row {row_num}: {e}")
-                    connection.rollback()
-                else:
-                    connection.commit()
+            committer.row_done(offset, row_num)
+    committer.commit()
     end_time = time.time()
     elapsed_minutes = (end_time - start_time) / 60
     print(
         f"Completed loading genres and title-genre relationships. Time taken: {elapsed_minutes:.2f} minutes.")
 
 
-# Call the function
-insert_genres_and_title_genres()
-
-insert_data_from_tsv('Artist_Profession', 'data/name.basics.tsv',
-                     artist_profession_insert_query, process_profession_row)
-insert_data_from_tsv('Artist_Known', 'data/name.basics.tsv',
-                     artist_known_insert_query, process_known_titles_row)
-
-# Close the cursor and connection
-cursor.close()
-connection.close()
+# Collects the genre vocabulary in one pass over title.basics.tsv and
+# upserts it into Genre with a single statement
+def load_genre_dimension():
+    start_time = time.time()
+    genres = set()
+    with open('data/title.basics.tsv', 'rb') as f:
+        for row_num, row, _ in read_tsv_rows(f):
+            try:
+                genres.update(genre for _, genre in process_genre_row(row) or [])
+            except IndexError:
+                print(f"Skipping row {row_num}: Row has fewer than 9 columns.")
+    try:
+        execute_values(cursor, genre_bulk_insert_query,
+                       [(genre,) for genre in sorted(genres)])
+    except psycopg2.Error as e:
+        print(f"Error inserting into Genre: {e}")
+        connection.rollback()
+    else:
+        connection.commit()
+    elapsed_minutes = (time.time() - start_time) / 60
+    print(
+        f"Completed loading {len(genres)} genres. Time taken: {elapsed_minutes:.2f} minutes.")
+
+
+# Returns the genre name -> GenreID map
+def fetch_genre_ids():
+    cursor.execute("SELECT genreName, GenreID FROM Genre")
+    return dict(cursor.fetchall())
+
+
+# Resolves the genres of a title through the genre map, dropping repeated
+# genres that would violate the Title_Genre primary key
+def process_title_genre_row(genre_ids, row):
+    genres = process_genre_row(row)
+    if not genres:
+        return None
+    return [(tconst, genre_ids[genre]) for tconst, genre in dict.fromkeys(genres)]
+
+
+# Table name -> (TSV file, insert query, row processing function)
+table_sources = {
+    'Artist': ('data/name.basics.tsv', artist_insert_query,
+               process_artist_row),
+    'Title': ('data/title.basics.tsv', title_insert_query, process_title_row),
+    'Principals': ('data/title.principals.tsv', principal_insert_query,
+                   process_principal_row),
+    'Rating': ('data/title.ratings.tsv', rating_insert_query,
+               process_rating_row),
+    'Title_Akas': ('data/title.akas.tsv', akas_insert_query,
+                   process_title_akas_row),
+    'Artist_Profession': ('data/name.basics.tsv',
+                          artist_profession_insert_query,
+                          process_profession_row),
+    'Artist_Known': ('data/name.basics.tsv', artist_known_insert_query,
+                     process_known_titles_row),
+}
+
+# Table name -> {record position: encoder} for the tconst/nconst columns
+# stored as integers in --int-keys mode
+int_key_columns = {
+    'Artist': {0: encode_nconst},
+    'Title': {0: encode_tconst},
+    'Principals': {0: encode_tconst, 2: encode_nconst},
+    'Rating': {0: encode_tconst},
+    'Title_Akas': {0: encode_tconst},
+    'Title_Genre': {0: encode_tconst},
+    'Artist_Profession': {0: encode_nconst},
+    'Artist_Known': {0: encode_nconst, 1: encode_tconst},
+}
+
+
+def encode_key_columns(key_columns, record):
+    return tuple(key_columns[i](value) if i in key_columns and value is not None
+                 else value for i, value in enumerate(record))
+
+
+# Wraps a process_*_row function so the key columns of its records are
+# integer encoded. Malformed identifiers raise ValueError like other
+# unparsable values.
+def process_int_key_row(process_row_func, key_columns, row):
+    data = process_row_func(row)
+    if isinstance(data, list):
+        return [encode_key_columns(key_columns, record) for record in data]
+    if data:
+        return encode_key_columns(key_columns, data)
+    return data
+
+
+# Changes the VARCHAR tconst/nconst columns of a schema to INTEGER
+def int_key_schema(schema_sql):
+    return re.sub(r'\b(tconst|nconst|titleID) VARCHAR\(20\)', r'\1 INTEGER',
+                  schema_sql)
+
+# Tables each table references through foreign keys. In row mode Genre and
+# Title_Genre are both filled by insert_genres_and_title_genres.
+table_dependencies = {
+    'Artist': [],
+    'Title': [],
+    'Genre': [],
+    'Principals': ['Title', 'Artist'],
+    'Rating': ['Title'],
+    'Title_Akas': ['Title'],
+    'Title_Genre': ['Title', 'Genre'],
+    'Artist_Profession': ['Artist'],
+    'Artist_Known': ['Artist'],
+}
+
+# Without foreign keys only the genre map orders the load
+deferred_table_dependencies = dict(
+    {table_name: [] for table_name in table_dependencies},
+    Title_Genre=['Genre'])
+
+# Sequential load order, parents before children
+load_order = ['Artist', 'Title', 'Principals', 'Rating', 'Title_Akas',
+              'Genre', 'Title_Genre', 'Artist_Profession', 'Artist_Known']
+
+
+# Loads one table, or one byte range of its TSV file, with the given mode.
+# Tables or ranges whose checkpoint is marked done are skipped.
+def load_table(table_name, mode='row', batch_size=DEFAULT_BATCH_SIZE,
+               commit_every=DEFAULT_COMMIT_EVERY, start=None, end=None,
+               int_keys=False):
+    key = checkpoint_key(table_name, start)
+    if checkpoints is not None and checkpoints.position(key)[2]:
+        print(f"Skipping {key}: already loaded according to its checkpoint.")
+        return table_name
+    if table_name == 'Genre':
+        if mode != 'row':
+            load_genre_dimension()
+    elif table_name == 'Title_Genre' and mode == 'row':
+        insert_genres_and_title_genres(int_keys)
+    else:
+        load_table_rows(table_name, mode, batch_size, commit_every, start, end,
+                        int_keys)
+    save_checkpoint(key, None, None, done=True)
+    return table_name
+
+
+def load_table_rows(table_name, mode, batch_size, commit_every, start, end,
+                    int_keys=False):
+    if table_name == 'Title_Genre':
+        tsv_file, query = 'data/title.basics.tsv', title_genre_id_insert_query
+        process_row_func = functools.partial(process_title_genre_row,
+                                             fetch_genre_ids())
+    else:
+        tsv_file, query, process_row_func = table_sources[table_name]
+    if int_keys:
+        process_row_func = functools.partial(process_int_key_row,
+                                             process_row_func,
+                                             int_key_columns[table_name])
+    if mode == 'copy':
+        copy_data_from_tsv(table_name, tsv_file, query, process_row_func,
+                           start, end)
+    elif mode == 'batch':
+        batch_insert_from_tsv(table_name, tsv_file, query, process_row_func,
+                              batch_size, commit_every, start, end)
+    else:
+        insert_data_from_tsv(table_name, tsv_file, query, process_row_func,
+                             start, end)
+
+
+# Loads every table in foreign-key order using the selected load mode
+def load_all_tables(mode='row', batch_size=DEFAULT_BATCH_SIZE,
+                    commit_every=DEFAULT_COMMIT_EVERY, int_keys=False):
+    for table_name in load_order:
+        load_table(table_name, mode, batch_size, commit_every,
+                   int_keys=int_keys)
+
+
+# Loads tables in parallel, each worker process on its own connection. A
+# table is scheduled once every table it depends on has finished, and the
+# files of chunked_tables are split into byte ranges that load concurrently.
+def load_tables_parallel(mode='row', workers=4, chunks=None,
+                         chunked_tables=('Principals', 'Title_Akas'),
+                         batch_size=DEFAULT_BATCH_SIZE,
+                         commit_every=DEFAULT_COMMIT_EVERY,
+                         dependencies=table_dependencies,
+                         checkpoint_dir=None, int_keys=False):
+    start_time = time.time()
+    chunks = chunks or workers
+    waiting = list(load_order)
+    finished_tables = set()
+    chunks_left = {}
+    pending = {}
+
+    # Spawned workers do not inherit (and later close) the parent connection
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(checkpoint_dir,),
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        def submit_ready_tables():
+            for table_name in list(waiting):
+                if not all(dependency in finished_tables for dependency in
+                           dependencies[table_name]):
+                    continue
+                waiting.remove(table_name)
+                if table_name in chunked_tables and table_name in table_sources:
+                    ranges = split_byte_ranges(table_sources[table_name][0],
+                                               chunks)
+                else:
+                    ranges = [(None, None)]
+                chunks_left[table_name] = len(ranges)
+                for start, end in ranges:
+                    future = pool.submit(load_table, table_name, mode,
+                                         batch_size, commit_every, start, end,
+                                         int_keys)
+                    pending[future] = table_name
+
+        submit_ready_tables()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                table_name = pending.pop(future)
+                future.result()  # Re-raise errors from the worker
+                chunks_left[table_name] -= 1
+                if chunks_left[table_name] == 0:
+                    finished_tables.add(table_name)
+            submit_ready_tables()
+
+    elapsed_minutes = (time.time() - start_time) / 60
+    print(f"Completed loading all tables with {workers} workers. Time taken: {elapsed_minutes:.2f} minutes.")
+
+
+# Tables whose keys are kept in the deferred constraint mode. The genre upsert
+# relies on the UNIQUE constraint of Genre, which only holds a few dozen rows.
+deferred_keep_keys = ('Genre',)
+
+
+# Removes the primary and foreign keys from the CREATE TABLE statements of a
+# schema, except for the tables in keep_tables. Other constraints (UNIQUE,
+# CHECK, DEFAULT) are kept.
+def constraint_free_schema(schema_sql, keep_tables=deferred_keep_keys):
+    statements = []
+    for statement in re.findall(r'CREATE TABLE.*?\);', schema_sql, re.S):
+        if re.match(r'CREATE TABLE (\w+)', statement).group(1) not in keep_tables:
+            statement = '\n'.join(line for line in statement.split('\n')
+                                  if not line.strip().startswith(('PRIMARY KEY', 'FOREIGN KEY')))
+            statement = re.sub(r' PRIMARY KEY| REFERENCES \w+\(\w+\)(?: ON DELETE CASCADE)?',
+                               '', statement)
+            statement = re.sub(r',(\s*\);)$', r'\1', statement)
+        statements.append(statement)
+    return '\n\n'.join(statements) + '\n'
+
+
+# (table, key columns) for the primary keys declared in SQL_tables.txt
+deferred_primary_keys = [
+    ('Artist', 'nconst'),
+    ('Artist_Profession', 'ProfID'),
+    ('Artist_Known', 'KnownID'),
+    ('Title', 'tconst'),
+    ('Title_Akas', 'akaID'),
+    ('Principals', 'principalID'),
+    ('Rating', 'tconst'),
+    ('Title_Genre', 'tconst, GenreID'),
+]
+
+# (table, column, referenced table, referenced column) for the foreign keys
+# declared in SQL_tables.txt
+deferred_foreign_keys = [
+    ('Artist_Profession', 'nconst', 'Artist', 'nconst'),
+    ('Artist_Known', 'nconst', 'Artist', 'nconst'),
+    ('Title_Akas', 'titleID', 'Title', 'tconst'),
+    ('Principals', 'tconst', 'Title', 'tconst'),
+    ('Principals', 'nconst', 'Artist', 'nconst'),
+    ('Rating', 'tconst', 'Title', 'tconst'),
+    ('Title_Genre', 'tconst', 'Title', 'tconst'),
+    ('Title_Genre', 'GenreID', 'Genre', 'GenreID'),
+]
+
+
+# Creates the tables of SQL_tables.txt without primary and foreign keys
+def create_tables_without_constraints(int_keys=False):
+    with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        schema_sql = constraint_free_schema(f.read())
+    cursor.execute(int_key_schema(schema_sql) if int_keys else schema_sql)
+    connection.commit()
+    print("Created tables without primary and foreign keys.")
+
+
+# Creates the tables of SQL_tables.txt with INTEGER tconst/nconst columns
+def create_int_key_tables():
+    with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        cursor.execute(int_key_schema(f.read()))
+    connection.commit()
+    print("Created tables with integer tconst/nconst keys.")
+
+
+# Builds the primary keys and foreign keys after the bulk load. Index builds
+# use parallel maintenance workers. Keys that cannot be built because of
+# duplicate or orphan rows are reported instead of aborting the load.
+def add_deferred_constraints(maintenance_workers=4):
+    start_time = time.time()
+    # Committed at once, so that rolling back a failed key keeps the setting
+    # for the rest of the session
+    cursor.execute(f"SET max_parallel_maintenance_workers = {int(maintenance_workers)}")
+    connection.commit()
+    report = []
+    missing_keys = {}  # table -> why its primary key was not created
+
+    for table_name, columns in deferred_primary_keys:
+        cursor.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {table_name} "
+            f"GROUP BY {columns} HAVING COUNT(*) > 1) duplicates")
+        duplicates = cursor.fetchone()[0]
+        if duplicates:
+            missing_keys[table_name] = f"{duplicates} duplicate keys"
+            report.append(f"{table_name}({columns}): {duplicates} duplicate keys, primary key not created")
+            continue
+        try:
+            cursor.execute(f"ALTER TABLE {table_name} ADD PRIMARY KEY ({columns})")
+        except psycopg2.Error as e:
+            print(f"Error adding primary key to {table_name}: {e}")
+            connection.rollback()
+            missing_keys[table_name] = str(e).strip()
+            report.append(f"{table_name}({columns}): primary key not created: {missing_keys[table_name]}")
+        else:
+            connection.commit()
+            print(f"Added primary key {table_name}({columns}).")
+
+    for table_name, column, parent_table, parent_column in deferred_foreign_keys:
+        constraint = f"{table_name}_{column}_fkey".lower()
+        if parent_table in missing_keys:
+            # A foreign key needs the referenced primary key
+            report.append(
+                f"{table_name}.{column} -> {parent_table}.{parent_column}: skipped, "
+                f"{parent_table} has no primary key ({missing_keys[parent_table]})")
+            continue
+        cursor.execute(
+            f"SELECT COUNT(*), (ARRAY_AGG(c.{column}))[1:5] "
+            f"FROM {table_name} c LEFT JOIN {parent_table} p "
+            f"ON c.{column} = p.{parent_column} "
+            f"WHERE c.{column} IS NOT NULL AND p.{parent_column} IS NULL")
+        orphans, examples = cursor.fetchone()
+        try:
+            # NOT VALID enforces the key for new rows without scanning the
+            # table; VALIDATE CONSTRAINT then checks the loaded rows
+            cursor.execute(
+                f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint} "
+                f"FOREIGN KEY ({column}) REFERENCES {parent_table}({parent_column}) "
+                f"ON DELETE CASCADE NOT VALID")
+            if not orphans:
+                cursor.execute(f"ALTER TABLE {table_name} VALIDATE CONSTRAINT {constraint}")
+        except psycopg2.Error as e:
+            print(f"Error adding foreign key {constraint}: {e}")
+            connection.rollback()
+            report.append(
+                f"{table_name}.{column} -> {parent_table}.{parent_column}: "
+                f"foreign key not created: {str(e).strip()}")
+            continue
+        connection.commit()
+        if orphans:
+            report.append(
+                f"{table_name}.{column} -> {parent_table}.{parent_column}: "
+                f"{orphans} orphan rows, e.g. {examples}; constraint left NOT VALID")
+        else:
+            print(f"Added foreign key {constraint}.")
+
+    elapsed_minutes = (time.time() - start_time) / 60
+    print(f"Built deferred constraints. Time taken: {elapsed_minutes:.2f} minutes.")
+    print("Validation report:")
+    for line in report or ["All keys created; no duplicate keys or orphan rows found."]:
+        print(f" - {line}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load the IMDb TSV files into the Phase 1 PostgreSQL schema.")
+    parser.add_argument(
+        '--mode', choices=['row', 'batch', 'copy'], default='row',
+        help="'row' inserts one row at a time and commits periodically, 'batch' inserts "
+             "with execute_values and skips only failing rows, 'copy' "
+             "streams each TSV through COPY ... FROM STDIN")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="rows per execute_values call in batch mode")
+    parser.add_argument('--commit-every', type=int,
+                        default=DEFAULT_COMMIT_EVERY,
+                        help="batches per commit in batch mode")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of tables or chunks loaded in parallel, "
+                             "each on its own connection")
+    parser.add_argument('--chunks', type=int, default=None,
+                        help="byte-range chunks per large file when loading "
+                             "in parallel (defaults to --workers)")
+    parser.add_argument('--deferred-constraints', action='store_true',
+                        help="create the tables without keys, load them and "
+                             "build primary and foreign keys afterwards")
+    parser.add_argument('--maintenance-workers', type=int, default=4,
+                        help="max_parallel_maintenance_workers used when "
+                             "building deferred keys")
+    parser.add_argument('--checkpoint-dir', default=DEFAULT_CHECKPOINT_DIR,
+                        help="directory holding the per-table checkpoints")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted load from its "
+                             "checkpoints (use the same --workers/--chunks)")
+    parser.add_argument('--int-keys', action='store_true',
+                        help="create the tables with INTEGER tconst/nconst "
+                             "columns and load the identifiers encoded as "
+                             "integers (tt0000001 -> 1)")
+    args = parser.parse_args()
+
+    connect()
+    open_checkpoints(args.checkpoint_dir, clear=not args.resume)
+    if args.deferred_constraints and not args.resume:
+        create_tables_without_constraints(args.int_keys)
+    elif args.int_keys and not args.resume:
+        create_int_key_tables()
+    if args.workers > 1:
+        load_tables_parallel(args.mode, args.workers, args.chunks,
+                             batch_size=args.batch_size,
+                             commit_every=args.commit_every,
+                             dependencies=(deferred_table_dependencies
+                                           if args.deferred_constraints
+                                           else table_dependencies),
+                             checkpoint_dir=args.checkpoint_dir,
+                             int_keys=args.int_keys)
+    else:
+        load_all_tables(args.mode, args.batch_size, args.commit_every,
+                        args.int_keys)
+    if args.deferred_constraints:
+        add_deferred_constraints(args.maintenance_workers)
+
+    # Close the cursor and connection
+    cursor.close()
+    connection.close()
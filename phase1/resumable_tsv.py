@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+import os
+
+"""
+CSCI-620: Project
+
+Byte-offset aware TSV reading and checkpoint files shared by the Phase 1
+(PostgreSQL) and Phase 2 (MongoDB) loaders, so that an interrupted load can
+resume from the last committed row instead of starting over.
+
+"""
+
+
+# Yields (line, offset) for the lines of a TSV file that start inside the
+# byte range [start, end), where offset is the byte position after the line.
+# A range starting at 0 skips the header row and a range starting mid-line
+# skips that partial line, which belongs to the previous range.
+def read_tsv_lines(f, start=None, end=None):
+    if start:
+        f.seek(start - 1)
+        position = start - 1 + len(f.readline())
+    else:
+        position = len(f.readline())  # Skip the header row
+    for line in iter(f.readline, b''):
+        if end is not None and position >= end:
+            break
+        position += len(line)
+        yield line.decode('utf-8'), position
+
+
+# Returns the position of the first line that starts at or after position
+def line_start(f, position):
+    if position <= 0:
+        return 0
+    f.seek(position - 1)
+    f.readline()
+    return f.tell()
+
+
+# Binary file object over the lines of a file that start inside the byte
+# range [start, end), aligned like read_tsv_lines except that a range
+# starting at 0 keeps the header row. Lets parsers such as pandas.read_csv
+# read one range of a file.
+class ByteRangeFile(io.RawIOBase):
+    def __init__(self, path, start=None, end=None):
+        self.f = open(path, 'rb')
+        self.limit = (os.path.getsize(path) if end is None
+                      else line_start(self.f, end))
+        self.f.seek(line_start(self.f, start or 0))
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.f.read(min(len(buffer), max(self.limit - self.f.tell(), 0)))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.f.close()
+        super().close()
+
+
+# Splits a file into byte ranges of roughly equal size. read_tsv_rows and
+# ByteRangeFile realign every range to line boundaries.
+def split_byte_ranges(path, chunks):
+    size = os.path.getsize(path)
+    step = max(size // chunks, 1)
+    bounds = list(range(0, size, step))[:chunks] + [size]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# Yields (row_num, row, offset) for the rows of a TSV file opened in binary
+# mode. offset is the byte position right after the row, which is where a
+# resumed load has to seek to. row_num continues from first_row.
+def read_tsv_rows(f, start=None, end=None, first_row=0):
+    position = start or 0
+
+    def lines():
+        nonlocal position
+        for line, position in read_tsv_lines(f, start, end):
+            yield line
+
+    reader = csv.reader(lines(), delimiter='\t')
+    for row_num, row in enumerate(reader, start=first_row + 1):
+        yield row_num, row, position
+
+
+# One small JSON file per table (or per byte range of a table) holding the
+# byte offset and row number of the last committed row. Separate files let
+# parallel workers checkpoint without coordinating with each other.
+class Checkpoints:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    # Removes all checkpoints, used when a load starts from scratch
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self.directory, name))
+
+    def get(self, key):
+        try:
+            with open(self.path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    # Written to a temporary file first so a crash never leaves a truncated
+    # checkpoint behind
+    def save(self, key, offset, row_num, done=False):
+        path = self.path(key)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'offset': offset, 'row': row_num, 'done': done}, f)
+        os.replace(path + '.tmp', path)
+
+    # Returns (offset, row_num, done) to resume the given key from
+    def position(self, key, start=None):
+        entry = self.get(key)
+        if entry is None:
+            return start, 0, False
+        return entry['offset'], entry['row'], entry['done']
+
+
+def checkpoint_key(name, start=None):
+    return name if start is None else f"{name}.{start}"
@@ -1,30 +1,20 @@
 import psycopg2
-import time
+import argparse
+import os
+import re
 
-connection = psycopg2.connect(
-    dbname="project",
-    user="postgres",
-    password="admin",
-    host="localhost",
-    port="5432"
-)
+from benchmark import (DEFAULT_REPETITIONS, DEFAULT_WARMUP, benchmark_queries,
+                       compare_results, non_negative_int, positive_int,
+                       write_results)
 
-def execute_query(query, query_name):
-    try:
-        with connection.cursor() as cursor:
-            print(f"\nExecuting {query_name}...\n")
-            start_time = time.time()
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            end_time = time.time()
-            execution_time = end_time - start_time
-            print(f"Execution time: {execution_time:.4f} seconds\n")
-            for row in rows[:5]:
-                print(row)
-            print("\n" + "-" * 50 + "\n")
-            return execution_time
-    except Exception as e:
-        print(f"An error occurred while executing {query_name}: {e}")
+# Database connection parameters
+db_params = {
+    'dbname': 'project',
+    'user': 'postgres',
+    'password': 'admin',
+    'host': 'localhost',
+    'port': '5432'
+}
 
 # SQL queries
 queries = {
@@ -91,35 +81,57 @@ indexes = [
     # Partial index: Optimizing queries filtering by high ratings
     "CREATE INDEX idx_high_average_rating ON Rating(averageRating) WHERE averageRating > 8.0;"
 ]
-# Measure execution times before indexing
-print("Execution times without indexes:")
-execution_times_without_indexes = {}
-for query_name, query in queries.items():
-    execution_times_without_indexes[query_name] = execute_query(query, query_name)
-# Create indexes
-with connection.cursor() as cursor:
-    print("\nCreating indexes...\n")
-    for index_query in indexes:
-        cursor.execute(index_query)
+
+
+# Drops the indexes above so that the run without indexes is a real baseline
+# even when the script has been run before
+def drop_indexes(connection):
+    with connection.cursor() as cursor:
+        for index_query in indexes:
+            index_name = re.search(r'CREATE INDEX (\w+)', index_query).group(1)
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name};")
     connection.commit()
-    print("Indexes created successfully.\n")
-# Measure execution times after indexing
-print("Execution times with indexes:")
-execution_times_with_indexes = {}
-for query_name, query in queries.items():
-    execution_times_with_indexes[query_name] = execute_query(query, query_name)
-# Compare performance
-print("\nComparison of Execution Times:")
-for query_name in queries.keys():
-    without_index = execution_times_without_indexes[query_name]
-    with_index = execution_times_with_indexes[query_name]
-    print(f"{query_name}:")
-    print(f" - Without indexes: {without_index:.4f} seconds")
-    print(f" - With indexes: {with_index:.4f} seconds")
-    if with_index < without_index:
-        improvement = without_index - with_index
-        print(f" - Improvement: {improvement:.4f} seconds ({(improvement / without_index) * 100:.2f}% faster)")
-    else:
-        print(" - Indexing had no significant impact or slightly increased execution time.")
-    print("-" * 50)
-connection.close()
\ No newline at end of file
+
+
+def create_indexes(connection):
+    with connection.cursor() as cursor:
+        print("\nCreating indexes...\n")
+        for index_query in indexes:
+            cursor.execute(index_query)
+        connection.commit()
+        print("Indexes created successfully.\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Phase 2 queries without and with indexes.")
+    parser.add_argument('--warmup', type=non_negative_int, default=DEFAULT_WARMUP,
+                        help="unmeasured runs per query before timing")
+    parser.add_argument('--repetitions', type=positive_int, default=DEFAULT_REPETITIONS,
+                        help="measured runs per query")
+    parser.add_argument('--output-dir', default='benchmark_results',
+                        help="directory for the JSON results of both runs")
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(**db_params)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Measure execution times before indexing
+    print("Execution times without indexes:")
+    drop_indexes(connection)
+    results_without_indexes = benchmark_queries(connection, queries,
+                                                args.warmup, args.repetitions)
+    write_results(os.path.join(args.output_dir, 'without_indexes.json'),
+                  results_without_indexes, 'without indexes')
+    # Create indexes
+    create_indexes(connection)
+    # Measure execution times after indexing
+    print("Execution times with indexes:")
+    results_with_indexes = benchmark_queries(connection, queries,
+                                             args.warmup, args.repetitions)
+    write_results(os.path.join(args.output_dir, 'with_indexes.json'),
+                  results_with_indexes, 'with indexes')
+    # Compare performance (median of the measured runs)
+    print("\nComparison of Execution Times:")
+    compare_results(results_without_indexes, results_with_indexes)
+    connection.close()
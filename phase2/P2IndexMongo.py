@@ -0,0 +1,204 @@
+import pymongo
+import time
+
+"""
+CSCI-620: Project Phase 2
+
+MongoDB counterpart of P2Index.py: runs aggregation-pipeline versions of the
+five Phase 2 queries against the collections built by load_data_mongo.py,
+without and with indexes, and reports the timings and query plans.
+
+"""
+
+client = pymongo.MongoClient("mongodb://localhost:27017/")
+db = client["movie_dataset"]
+
+
+# Returns the plan stages of an explain() result, e.g. COLLSCAN or
+# IXSCAN(idx_titles_genres)
+def plan_stages(plan):
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stage = plan["stage"]
+            if "indexName" in plan:
+                stage += f"({plan['indexName']})"
+            stages.append(stage)
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+def explain_pipeline(collection_name, pipeline):
+    explanation = db.command(
+        "explain", {"aggregate": collection_name, "pipeline": pipeline,
+                    "cursor": {}},
+        verbosity="queryPlanner")
+    # Drop duplicates while keeping the order the stages appear in
+    return " -> ".join(dict.fromkeys(plan_stages(explanation))) or "unknown"
+
+
+def execute_pipeline(collection_name, pipeline, query_name):
+    try:
+        print(f"\nExecuting {query_name}...\n")
+        start_time = time.time()
+        rows = list(db[collection_name].aggregate(pipeline, allowDiskUse=True))
+        end_time = time.time()
+        execution_time = end_time - start_time
+        print(f"Execution time: {execution_time:.4f} seconds")
+        print(f"Plan: {explain_pipeline(collection_name, pipeline)}\n")
+        for row in rows[:5]:
+            print(row)
+        print("\n" + "-" * 50 + "\n")
+        return execution_time
+    except Exception as e:
+        print(f"An error occurred while executing {query_name}: {e}")
+
+
+# Looks up the artist names of the nconst fields of each result
+def artist_name_lookup(local_field, name_field):
+    return [
+        {"$lookup": {"from": "artists", "localField": local_field,
+                     "foreignField": "nconst", "as": name_field,
+                     "pipeline": [{"$project": {"_id": 0, "primaryName": 1}}]}},
+        {"$set": {name_field: {"$arrayElemAt": [f"${name_field}.primaryName", 0]}}},
+    ]
+
+
+# Aggregation pipelines equivalent to the SQL queries in P2Index.py. Artists
+# are grouped by nconst rather than by primaryName.
+queries = {
+    "Query 1: Top 5 Artists with the Most Genre Diversity in Their Titles": (
+        "principals", [
+            {"$lookup": {"from": "titles", "localField": "tconst",
+                         "foreignField": "tconst", "as": "title",
+                         "pipeline": [{"$project": {"_id": 0, "genres": 1}}]}},
+            {"$unwind": "$title"},
+            {"$unwind": "$title.genres"},
+            {"$group": {"_id": "$nconst",
+                        "genres": {"$addToSet": "$title.genres"}}},
+            {"$project": {"genre_diversity": {"$size": "$genres"}}},
+            {"$sort": {"genre_diversity": -1}},
+            {"$limit": 5},
+        ] + artist_name_lookup("_id", "primaryName")),
+    "Query 2: Average Rating per Genre": (
+        "titles", [
+            {"$match": {"averageRating": {"$ne": None}}},
+            {"$unwind": "$genres"},
+            {"$group": {"_id": "$genres",
+                        "avg_rating": {"$avg": "$averageRating"}}},
+            {"$sort": {"avg_rating": -1}},
+        ]),
+    "Query 3: Artists with the Longest Career Span in Media": (
+        "principals", [
+            {"$lookup": {"from": "titles", "localField": "tconst",
+                         "foreignField": "tconst", "as": "title",
+                         "pipeline": [
+                             {"$match": {"startYear": {"$ne": None},
+                                         "endYear": {"$ne": None}}},
+                             {"$project": {"_id": 0, "startYear": 1,
+                                           "endYear": 1}}]}},
+            {"$unwind": "$title"},
+            {"$group": {"_id": "$nconst",
+                        "career_start": {"$min": "$title.startYear"},
+                        "career_end": {"$max": "$title.endYear"}}},
+            {"$set": {"career_span": {"$subtract": ["$career_end",
+                                                    "$career_start"]}}},
+            {"$sort": {"career_span": -1}},
+            {"$limit": 5},
+        ] + artist_name_lookup("_id", "primaryName")),
+    "Query 4: Most Frequent Collaborations Between Artists": (
+        "principals", [
+            {"$group": {"_id": "$tconst", "cast": {"$push": "$nconst"}}},
+            {"$project": {"artist_1": "$cast", "artist_2": "$cast"}},
+            {"$unwind": "$artist_1"},
+            {"$unwind": "$artist_2"},
+            {"$match": {"$expr": {"$lt": ["$artist_1", "$artist_2"]}}},
+            {"$group": {"_id": {"artist_1": "$artist_1",
+                                "artist_2": "$artist_2"},
+                        "collaboration_count": {"$sum": 1}}},
+            {"$sort": {"collaboration_count": -1}},
+            {"$limit": 5},
+        ] + artist_name_lookup("_id.artist_1", "artist_1")
+          + artist_name_lookup("_id.artist_2", "artist_2")),
+    "Query 5: Average Runtime of Titles by Genre and Year": (
+        "titles", [
+            {"$match": {"startYear": {"$ne": None},
+                        "runtimeMinutes": {"$ne": None}}},
+            {"$unwind": "$genres"},
+            {"$group": {"_id": {"genreName": "$genres",
+                                "startYear": "$startYear"},
+                        "avg_runtime": {"$avg": "$runtimeMinutes"}}},
+            {"$sort": {"_id.genreName": 1, "_id.startYear": 1}},
+        ]),
+}
+
+# Index definitions: (collection, keys, options)
+indexes = [
+    ("titles", [("tconst", 1)], {"name": "idx_titles_tconst", "unique": True}),
+    ("artists", [("nconst", 1)], {"name": "idx_artists_nconst", "unique": True}),
+    ("principals", [("tconst", 1)], {"name": "idx_principals_tconst"}),
+    ("principals", [("nconst", 1)], {"name": "idx_principals_nconst"}),
+    # Multikey index over the genres array
+    ("titles", [("genres", 1)], {"name": "idx_titles_genres"}),
+    # Compound index: genre and year filters and sorts
+    ("titles", [("genres", 1), ("startYear", 1)],
+     {"name": "idx_titles_genres_start_year"}),
+    # Partial index: Optimizing queries filtering by high ratings
+    ("titles", [("averageRating", 1)],
+     {"name": "idx_titles_high_average_rating",
+      "partialFilterExpression": {"averageRating": {"$gt": 8.0}}}),
+]
+
+
+# Drops every secondary index on the benchmarked collections, including the
+# ones created by load_data_mongo.py --embed, so the baseline has none
+def drop_indexes():
+    for collection_name in {collection for collection, _, _ in indexes}:
+        db[collection_name].drop_indexes()
+
+
+def create_indexes():
+    for collection_name, keys, options in indexes:
+        db[collection_name].create_index(keys, **options)
+
+
+def execute_queries():
+    return {query_name: execute_pipeline(collection_name, pipeline, query_name)
+            for query_name, (collection_name, pipeline) in queries.items()}
+
+
+if __name__ == "__main__":
+    # Measure execution times before indexing
+    print("Execution times without indexes:")
+    drop_indexes()
+    execution_times_without_indexes = execute_queries()
+    # Create indexes
+    print("\nCreating indexes...\n")
+    create_indexes()
+    print("Indexes created successfully.\n")
+    # Measure execution times after indexing
+    print("Execution times with indexes:")
+    execution_times_with_indexes = execute_queries()
+    # Compare performance
+    print("\nComparison of Execution Times:")
+    for query_name in queries.keys():
+        without_index = execution_times_without_indexes[query_name]
+        with_index = execution_times_with_indexes[query_name]
+        print(f"{query_name}:")
+        if without_index is None or with_index is None:
+            print(" - Query failed, no comparison available.")
+            print("-" * 50)
+            continue
+        print(f" - Without indexes: {without_index:.4f} seconds")
+        print(f" - With indexes: {with_index:.4f} seconds")
+        if with_index < without_index:
+            improvement = without_index - with_index
+            print(f" - Improvement: {improvement:.4f} seconds ({(improvement / without_index) * 100:.2f}% faster)")
+        else:
+            print(" - Indexing had no significant impact or slightly increased execution time.")
+        print("-" * 50)
+    client.close()
@@ -0,0 +1,314 @@
+import psycopg2
+from psycopg2.extras import execute_values
+import argparse
+import os
+import sys
+import time
+
+# Identifier encoding shared with the Phase 1 loader
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'phase1'))
+from imdb_ids import encode_tconst
+
+"""
+CSCI-620: Project Phase 2
+
+Summary tables for the five analytics queries in P2query.py. The full joins
+over Principals, Title_Genre and Genre are computed once into mv_* tables,
+so that the dashboard queries become index lookups on small tables.
+
+The tables can be rebuilt from scratch, or refreshed incrementally after a
+load: given the tconsts that were inserted or updated, only the groups
+(artists, genres, artist pairs) that those titles touch are recomputed.
+Deleted titles need a full refresh, because their artists and genres can no
+longer be found through the cascaded Principals and Title_Genre rows.
+
+"""
+
+# Database connection parameters
+db_params = {
+    'dbname': 'project',
+    'user': 'postgres',
+    'password': 'admin',
+    'host': 'localhost',
+    'port': '5432'
+}
+
+# Summary table definitions. "select" is the query of P2query.py without its
+# ORDER BY/LIMIT, with a {where} placeholder used to restrict it to the
+# affected groups; "affected" selects the rows an incremental refresh
+# replaces. A summary whose restriction cannot be a WHERE clause gives its
+# incremental query as "incremental_select" instead.
+summaries = {
+    "mv_genre_diversity": {
+        "create": """
+        CREATE TABLE IF NOT EXISTS mv_genre_diversity (
+            primaryName TEXT,
+            genre_diversity BIGINT
+        );
+        CREATE INDEX IF NOT EXISTS idx_mv_genre_diversity_name ON mv_genre_diversity(primaryName);
+        CREATE INDEX IF NOT EXISTS idx_mv_genre_diversity_count ON mv_genre_diversity(genre_diversity DESC);
+        """,
+        "select": """
+        SELECT A.primaryName, COUNT(DISTINCT G.genreName) AS genre_diversity
+        FROM Artist A
+        JOIN Principals P ON A.nconst = P.nconst
+        JOIN Title_Genre TG ON P.tconst = TG.tconst
+        JOIN Genre G ON TG.GenreID = G.GenreID
+        {where}
+        GROUP BY A.primaryName
+        """,
+        "where": "WHERE A.primaryName IN (SELECT primaryName FROM affected_artists)",
+        "affected": "primaryName IN (SELECT primaryName FROM affected_artists)",
+    },
+    "mv_genre_rating": {
+        "create": """
+        CREATE TABLE IF NOT EXISTS mv_genre_rating (
+            genreName VARCHAR(50),
+            avg_rating NUMERIC
+        );
+        CREATE INDEX IF NOT EXISTS idx_mv_genre_rating_genre ON mv_genre_rating(genreName);
+        """,
+        "select": """
+        SELECT G.genreName, AVG(R.averageRating) AS avg_rating
+        FROM Genre G
+        JOIN Title_Genre TG ON G.GenreID = TG.GenreID
+        JOIN Rating R ON TG.tconst = R.tconst
+        {where}
+        GROUP BY G.genreName
+        """,
+        "where": "WHERE G.genreName IN (SELECT genreName FROM affected_genres)",
+        "affected": "genreName IN (SELECT genreName FROM affected_genres)",
+    },
+    "mv_career_span": {
+        "create": """
+        CREATE TABLE IF NOT EXISTS mv_career_span (
+            primaryName TEXT,
+            career_start INT,
+            career_end INT,
+            career_span INT
+        );
+        CREATE INDEX IF NOT EXISTS idx_mv_career_span_name ON mv_career_span(primaryName);
+        CREATE INDEX IF NOT EXISTS idx_mv_career_span_span ON mv_career_span(career_span DESC);
+        """,
+        "select": """
+        SELECT A.primaryName, MIN(T.startYear) AS career_start, MAX(T.endYear) AS career_end,
+               (MAX(T.endYear) - MIN(T.startYear)) AS career_span
+        FROM Artist A
+        JOIN Principals P ON A.nconst = P.nconst
+        JOIN Title T ON P.tconst = T.tconst
+        WHERE T.startYear IS NOT NULL AND T.endYear IS NOT NULL
+        {where}
+        GROUP BY A.primaryName
+        """,
+        "where": "AND A.primaryName IN (SELECT primaryName FROM affected_artists)",
+        "affected": "primaryName IN (SELECT primaryName FROM affected_artists)",
+    },
+    "mv_collaborations": {
+        "create": """
+        CREATE TABLE IF NOT EXISTS mv_collaborations (
+            artist_1 TEXT,
+            artist_2 TEXT,
+            collaboration_count BIGINT
+        );
+        CREATE INDEX IF NOT EXISTS idx_mv_collaborations_artist_1 ON mv_collaborations(artist_1);
+        CREATE INDEX IF NOT EXISTS idx_mv_collaborations_artist_2 ON mv_collaborations(artist_2);
+        CREATE INDEX IF NOT EXISTS idx_mv_collaborations_count ON mv_collaborations(collaboration_count DESC);
+        """,
+        "select": """
+        SELECT A1.primaryName AS artist_1, A2.primaryName AS artist_2, COUNT(*) AS collaboration_count
+        FROM Principals P1
+        JOIN Principals P2 ON P1.tconst = P2.tconst AND P1.nconst < P2.nconst
+        JOIN Artist A1 ON P1.nconst = A1.nconst
+        JOIN Artist A2 ON P2.nconst = A2.nconst
+        {where}
+        GROUP BY A1.primaryName, A2.primaryName
+        """,
+        # Only the principals of affected artists are self-joined, once on
+        # each side of the pair. UNION keeps a pair of two affected artists
+        # from being counted twice.
+        "incremental_select": """
+        WITH affected_principals AS (
+            SELECT P.principalID, P.tconst, P.nconst
+            FROM Principals P
+            JOIN Artist A ON P.nconst = A.nconst
+            WHERE A.primaryName IN (SELECT primaryName FROM affected_artists)
+        ),
+        pairs AS (
+            SELECT P1.principalID AS principal_1, P2.principalID AS principal_2,
+                   P1.nconst AS nconst_1, P2.nconst AS nconst_2
+            FROM affected_principals P1
+            JOIN Principals P2 ON P1.tconst = P2.tconst AND P1.nconst < P2.nconst
+            UNION
+            SELECT P1.principalID, P2.principalID, P1.nconst, P2.nconst
+            FROM Principals P1
+            JOIN affected_principals P2 ON P1.tconst = P2.tconst AND P1.nconst < P2.nconst
+        )
+        SELECT A1.primaryName AS artist_1, A2.primaryName AS artist_2, COUNT(*) AS collaboration_count
+        FROM pairs
+        JOIN Artist A1 ON pairs.nconst_1 = A1.nconst
+        JOIN Artist A2 ON pairs.nconst_2 = A2.nconst
+        GROUP BY A1.primaryName, A2.primaryName
+        """,
+        "affected": "artist_1 IN (SELECT primaryName FROM affected_artists) "
+                    "OR artist_2 IN (SELECT primaryName FROM affected_artists)",
+    },
+    "mv_runtime_by_genre_year": {
+        "create": """
+        CREATE TABLE IF NOT EXISTS mv_runtime_by_genre_year (
+            genreName VARCHAR(50),
+            startYear INT,
+            avg_runtime NUMERIC
+        );
+        CREATE INDEX IF NOT EXISTS idx_mv_runtime_genre_year ON mv_runtime_by_genre_year(genreName, startYear);
+        """,
+        "select": """
+        SELECT G.genreName, T.startYear, AVG(T.runtimeMinutes) AS avg_runtime
+        FROM Title T
+        JOIN Title_Genre TG ON T.tconst = TG.tconst
+        JOIN Genre G ON TG.GenreID = G.GenreID
+        WHERE T.startYear IS NOT NULL AND T.runtimeMinutes IS NOT NULL
+        {where}
+        GROUP BY G.genreName, T.startYear
+        """,
+        "where": "AND G.genreName IN (SELECT genreName FROM affected_genres)",
+        "affected": "genreName IN (SELECT genreName FROM affected_genres)",
+    },
+}
+
+# The queries of P2query.py answered from the summary tables
+queries = {
+    "Query 1: Top 5 Artists with the Most Genre Diversity in Their Titles": """
+    SELECT primaryName, genre_diversity
+    FROM mv_genre_diversity
+    ORDER BY genre_diversity DESC
+    LIMIT 5;
+    """,
+    "Query 2: Average Rating per Genre": """
+    SELECT genreName, avg_rating
+    FROM mv_genre_rating
+    ORDER BY avg_rating DESC;
+    """,
+    "Query 3: Artists with the Longest Career Span in Media": """
+    SELECT primaryName, career_start, career_end, career_span
+    FROM mv_career_span
+    ORDER BY career_span DESC
+    LIMIT 5;
+    """,
+    "Query 4: Most Frequent Collaborations Between Artists": """
+    SELECT artist_1, artist_2, collaboration_count
+    FROM mv_collaborations
+    ORDER BY collaboration_count DESC
+    LIMIT 5;
+    """,
+    "Query 5: Average Runtime of Titles by Genre and Year": """
+    SELECT genreName, startYear, avg_runtime
+    FROM mv_runtime_by_genre_year
+    ORDER BY genreName, startYear;
+    """
+}
+
+
+def create_summary_tables(connection):
+    with connection.cursor() as cursor:
+        for definition in summaries.values():
+            cursor.execute(definition["create"])
+    connection.commit()
+
+
+# Rebuilds every summary table from scratch, one transaction per table
+def refresh_all(connection):
+    create_summary_tables(connection)
+    for table_name, definition in summaries.items():
+        start_time = time.time()
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {table_name}")
+            cursor.execute(f"INSERT INTO {table_name} "
+                           + definition["select"].format(where=""))
+            cursor.execute(f"ANALYZE {table_name}")
+        connection.commit()
+        print(f"Refreshed {table_name}. Time taken: {time.time() - start_time:.2f} seconds.")
+
+
+# Recomputes only the groups touched by the given inserted or updated
+# titles, in a single transaction. With int_keys the tconsts are encoded to
+# match a database loaded with load_data__postgres.py --int-keys.
+def refresh_incremental(connection, tconsts, int_keys=False):
+    create_summary_tables(connection)
+    start_time = time.time()
+    key_type = 'INTEGER' if int_keys else 'VARCHAR(20)'
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE changed_titles (tconst {key_type} PRIMARY KEY) ON COMMIT DROP")
+        execute_values(cursor, "INSERT INTO changed_titles (tconst) VALUES %s ON CONFLICT DO NOTHING",
+                       [(encode_tconst(tconst) if int_keys else tconst,) for tconst in tconsts])
+        cursor.execute("""
+        CREATE TEMP TABLE affected_artists ON COMMIT DROP AS
+        SELECT DISTINCT A.primaryName
+        FROM changed_titles C
+        JOIN Principals P ON C.tconst = P.tconst
+        JOIN Artist A ON P.nconst = A.nconst
+        """)
+        cursor.execute("""
+        CREATE TEMP TABLE affected_genres ON COMMIT DROP AS
+        SELECT DISTINCT G.genreName
+        FROM changed_titles C
+        JOIN Title_Genre TG ON C.tconst = TG.tconst
+        JOIN Genre G ON TG.GenreID = G.GenreID
+        """)
+        for table_name, definition in summaries.items():
+            cursor.execute(f"DELETE FROM {table_name} WHERE {definition['affected']}")
+            deleted = cursor.rowcount
+            select = (definition.get("incremental_select")
+                      or definition["select"].format(where=definition["where"]))
+            cursor.execute(f"INSERT INTO {table_name} " + select)
+            print(f"{table_name}: replaced {deleted} rows with {cursor.rowcount} rows.")
+    connection.commit()
+    print(f"Incremental refresh for {len(tconsts)} titles. Time taken: {time.time() - start_time:.2f} seconds.")
+
+
+# Function to execute queries
+def execute_query(connection, query, query_name):
+    try:
+        with connection.cursor() as cursor:
+            print(f"\nExecuting {query_name}...\n")
+            start_time = time.time()
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            end_time = time.time()
+            execution_time = end_time - start_time
+            print(f"Execution time: {execution_time:.4f} seconds\n")
+            for row in rows[:5]:
+                print(row)
+            print("\n" + "-" * 50 + "\n")
+    except Exception as e:
+        print(f"An error occurred while executing {query_name}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Maintain and query the summary tables behind the Phase 2 queries.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    refresh_parser = subparsers.add_parser(
+        "refresh", help="rebuild the summary tables, or only the groups "
+                        "touched by the titles in --tconst-file")
+    refresh_parser.add_argument(
+        "--tconst-file", help="file with one inserted or updated tconst per line")
+    refresh_parser.add_argument(
+        "--int-keys", action="store_true",
+        help="the database was loaded with load_data__postgres.py --int-keys")
+    subparsers.add_parser("query", help="run the Phase 2 queries on the summary tables")
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(**db_params)
+    try:
+        if args.command == "refresh" and args.tconst_file:
+            with open(args.tconst_file, 'r', encoding='utf-8') as f:
+                changed = [line.strip() for line in f if line.strip()]
+            refresh_incremental(connection, changed, args.int_keys)
+        elif args.command == "refresh":
+            refresh_all(connection)
+        else:
+            for query_name, query in queries.items():
+                execute_query(connection, query, query_name)
+    finally:
+        connection.close()
@@ -0,0 +1,168 @@
+import argparse
+import json
+import math
+import statistics
+import time
+
+"""
+CSCI-620: Project Phase 2
+
+Query benchmark harness used by P2Index.py. Each query is run a number of
+warm-up times (to fill the buffer cache) and then timed over several
+measured repetitions. The median, p95 and standard deviation are reported
+together with the EXPLAIN (ANALYZE, BUFFERS) plan, and results are written
+as JSON so that runs can be compared to catch regressions:
+
+    python benchmark.py diff old.json new.json
+
+"""
+
+DEFAULT_WARMUP = 2
+DEFAULT_REPETITIONS = 10
+
+
+# argparse types for the numeric options, so that a bad value is rejected
+# with a usage message instead of failing halfway through a run
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must not be negative, got {value}")
+    return number
+
+
+def non_negative_float(value):
+    number = float(value)
+    if not number >= 0:  # Also rejects nan
+        raise argparse.ArgumentTypeError(f"must not be negative, got {value}")
+    return number
+
+
+# Nearest-rank percentile of a list of samples
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+# Extracts the numbers worth diffing from an EXPLAIN (FORMAT JSON) result
+def plan_summary(plan):
+    root = plan[0]
+    return {
+        "planning_time_ms": root.get("Planning Time"),
+        "execution_time_ms": root.get("Execution Time"),
+        "node_type": root["Plan"].get("Node Type"),
+        "total_cost": root["Plan"].get("Total Cost"),
+        "shared_hit_blocks": root["Plan"].get("Shared Hit Blocks"),
+        "shared_read_blocks": root["Plan"].get("Shared Read Blocks"),
+    }
+
+
+def benchmark_query(connection, query, warmup=DEFAULT_WARMUP,
+                    repetitions=DEFAULT_REPETITIONS):
+    if repetitions < 1:
+        raise ValueError("`repetitions` must be at least 1.")
+    with connection.cursor() as cursor:
+        for _ in range(warmup):
+            cursor.execute(query)
+            cursor.fetchall()
+        samples = []
+        for _ in range(repetitions):
+            start_time = time.perf_counter()
+            cursor.execute(query)
+            rows = cursor.fetchall()
+            samples.append(time.perf_counter() - start_time)
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query)
+        plan = cursor.fetchone()[0]
+    connection.rollback()  # End the read-only transaction
+    return {
+        "warmup": warmup,
+        "repetitions": repetitions,
+        "samples": samples,
+        "median": statistics.median(samples),
+        "p95": percentile(samples, 0.95),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "min": min(samples),
+        "max": max(samples),
+        "rows": len(rows),
+        "first_rows": [list(map(str, row)) for row in rows[:5]],
+        "plan_summary": plan_summary(plan),
+        "plan": plan,
+    }
+
+
+# Benchmarks every query of a {name: sql} dictionary. A failing query is
+# reported and recorded with its error instead of stopping the run.
+def benchmark_queries(connection, queries, warmup=DEFAULT_WARMUP,
+                      repetitions=DEFAULT_REPETITIONS):
+    results = {}
+    for query_name, query in queries.items():
+        print(f"\nBenchmarking {query_name}...")
+        try:
+            result = benchmark_query(connection, query, warmup, repetitions)
+        except Exception as e:
+            print(f"An error occurred while executing {query_name}: {e}")
+            connection.rollback()
+            results[query_name] = {"error": str(e)}
+            continue
+        print(f"median {result['median']:.4f}s, p95 {result['p95']:.4f}s, "
+              f"stdev {result['stdev']:.4f}s over {repetitions} runs "
+              f"({warmup} warm-up)")
+        for row in result["first_rows"]:
+            print(row)
+        results[query_name] = result
+    return results
+
+
+def write_results(path, results, label=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"label": label, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "results": results}, f, indent=2)
+    print(f"\nBenchmark results written to {path}")
+
+
+def read_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)["results"]
+
+
+# Prints the median of every query in both result sets and returns the
+# queries whose median got slower by more than threshold (a fraction)
+def compare_results(baseline, current, threshold=0.10):
+    regressions = []
+    for query_name in list(baseline) + [name for name in current if name not in baseline]:
+        before = baseline.get(query_name, {}).get("median")
+        after = current.get(query_name, {}).get("median")
+        print(f"{query_name}:")
+        if before is None or after is None:
+            print(" - Missing or failed in one of the runs.")
+            continue
+        change = (after - before) / before if before else 0.0
+        print(f" - Median: {before:.4f}s -> {after:.4f}s ({change * 100:+.2f}%)")
+        if change > threshold:
+            print(" - REGRESSION")
+            regressions.append(query_name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    diff_parser = subparsers.add_parser("diff", help="compare two result files")
+    diff_parser.add_argument("baseline")
+    diff_parser.add_argument("current")
+    diff_parser.add_argument("--threshold", type=non_negative_float, default=0.10,
+                             help="relative median slowdown reported as a regression")
+    args = parser.parse_args()
+
+    regressions = compare_results(read_results(args.baseline),
+                                  read_results(args.current), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} queries regressed by more than {args.threshold * 100:.0f}%.")
+        raise SystemExit(1)
+    print("\nNo regressions found.")
@@ -0,0 +1,232 @@
+import psycopg2
+import argparse
+import heapq
+import io
+import itertools
+import os
+import struct
+import tempfile
+import sys
+import time
+from collections import defaultdict
+
+# Identifier encoding shared with the Phase 1 loader
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'phase1'))
+from imdb_ids import decode_nconst, encode_nconst
+
+"""
+CSCI-620: Project Phase 2
+
+Collaboration engine for Query 4 ("Most Frequent Collaborations Between
+Artists"). Instead of self-joining Principals, the principals are streamed
+in tconst order through a server-side cursor and the artist pairs of every
+title are counted in Python. Each nconst is encoded as an integer (see
+phase1/imdb_ids.py) and a pair as a single 64-bit key. When the in-memory
+counter grows past max_pairs it is spilled to disk as a sorted run, and the
+runs are merged at the end, so memory stays bounded while the counts stay
+exact.
+
+Pairs are counted per nconst, whereas the SQL query groups by primaryName
+and therefore merges artists that share a name.
+
+"""
+
+# Database connection parameters
+db_params = {
+    'dbname': 'project',
+    'user': 'postgres',
+    'password': 'admin',
+    'host': 'localhost',
+    'port': '5432'
+}
+
+DEFAULT_MAX_PAIRS = 5000000
+DEFAULT_ITERSIZE = 100000
+
+# (pair key, count) as stored in the spilled runs
+PAIR_RECORD = struct.Struct('<QI')
+
+
+def pair_key(nconst_id_1, nconst_id_2):
+    return (nconst_id_1 << 32) | nconst_id_2
+
+
+def split_pair_key(key):
+    return key >> 32, key & 0xFFFFFFFF
+
+
+def read_run(path):
+    with open(path, 'rb') as f:
+        while True:
+            record = f.read(PAIR_RECORD.size)
+            if not record:
+                return
+            yield PAIR_RECORD.unpack(record)
+
+
+# Exact pair counter that spills sorted runs to disk once it holds max_pairs
+# distinct pairs
+class SpillingPairCounter:
+    def __init__(self, max_pairs=DEFAULT_MAX_PAIRS, spill_dir=None):
+        self.max_pairs = max_pairs
+        self.spill_dir = spill_dir
+        self.counts = defaultdict(int)
+        self.runs = []
+
+    # Counts every pair of principals of one title with nconst_1 < nconst_2,
+    # like the P1.nconst < P2.nconst self-join
+    def add_title(self, nconst_ids):
+        nconst_ids = sorted(nconst_ids)
+        for i, nconst_id_1 in enumerate(nconst_ids):
+            for nconst_id_2 in nconst_ids[i + 1:]:
+                if nconst_id_1 < nconst_id_2:
+                    self.counts[pair_key(nconst_id_1, nconst_id_2)] += 1
+        if len(self.counts) >= self.max_pairs:
+            self.spill()
+
+    def spill(self):
+        with tempfile.NamedTemporaryFile('wb', dir=self.spill_dir,
+                                         suffix='.pairs', delete=False) as f:
+            for key in sorted(self.counts):
+                f.write(PAIR_RECORD.pack(key, self.counts[key]))
+            self.runs.append(f.name)
+        self.counts.clear()
+
+    # Yields (pair key, total count) in key order across all runs
+    def items(self):
+        in_memory = sorted(self.counts.items())
+        merged = heapq.merge(in_memory, *(read_run(path) for path in self.runs))
+        for key, group in itertools.groupby(merged, key=lambda item: item[0]):
+            yield key, sum(count for _, count in group)
+
+    def close(self):
+        for path in self.runs:
+            os.remove(path)
+        self.runs = []
+        self.counts.clear()
+
+
+# Streams (tconst, nconst) in tconst order through a named (server-side)
+# cursor and feeds the nconsts of every title to the counter
+def count_collaborations(connection, counter, itersize=DEFAULT_ITERSIZE):
+    start_time = time.time()
+    titles = 0
+    with connection.cursor(name='principals_by_title') as cursor:
+        cursor.itersize = itersize
+        cursor.execute("SELECT tconst, nconst FROM Principals "
+                       "WHERE nconst IS NOT NULL ORDER BY tconst")
+        for _, rows in itertools.groupby(cursor, key=lambda row: row[0]):
+            counter.add_title([encode_nconst(nconst) for _, nconst in rows])
+            titles += 1
+    print(f"Counted pairs for {titles} titles with {len(counter.runs)} spilled runs. "
+          f"Time taken: {(time.time() - start_time) / 60:.2f} minutes.")
+
+
+# Copies (nconst_1, nconst_2, count) rows into collaboration_counts in
+# chunks while the merged pair counts stream by
+class PairCountWriter:
+    def __init__(self, connection, chunk_rows=DEFAULT_ITERSIZE, int_keys=False):
+        self.connection = connection
+        self.chunk_rows = chunk_rows
+        self.int_keys = int_keys
+        self.buffer = io.StringIO()
+        self.rows = 0
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS collaboration_counts")
+            key_type = 'INTEGER' if int_keys else 'VARCHAR(20)'
+            cursor.execute(f"""
+            CREATE TABLE collaboration_counts (
+                nconst_1 {key_type},
+                nconst_2 {key_type},
+                collaboration_count INT
+            )""")
+
+    def write(self, key, count):
+        nconst_1, nconst_2 = split_pair_key(key)
+        if not self.int_keys:
+            nconst_1, nconst_2 = decode_nconst(nconst_1), decode_nconst(nconst_2)
+        self.buffer.write(f"{nconst_1}\t{nconst_2}\t{count}\n")
+        self.rows += 1
+        if self.rows % self.chunk_rows == 0:
+            self.flush()
+
+    def flush(self):
+        self.buffer.seek(0)
+        with self.connection.cursor() as cursor:
+            cursor.copy_expert("COPY collaboration_counts (nconst_1, nconst_2, collaboration_count) "
+                               "FROM STDIN", self.buffer)
+        self.buffer = io.StringIO()
+
+    def close(self):
+        self.flush()
+        with self.connection.cursor() as cursor:
+            cursor.execute("CREATE INDEX idx_collaboration_counts_count "
+                           "ON collaboration_counts(collaboration_count DESC)")
+        self.connection.commit()
+        print(f"Wrote {self.rows} pair counts to collaboration_counts.")
+
+
+# Merges the counted pairs, returning the top_k (count, nconst_1, nconst_2)
+# with integer encoded nconsts, and optionally writing every pair count back
+# to the database
+def top_collaborations(connection, counter, top_k=5, write_table=False,
+                       int_keys=False):
+    writer = PairCountWriter(connection, int_keys=int_keys) if write_table else None
+    top = []  # min-heap of (count, key)
+    for key, count in counter.items():
+        if writer is not None:
+            writer.write(key, count)
+        if len(top) < top_k:
+            heapq.heappush(top, (count, key))
+        elif count > top[0][0]:
+            heapq.heapreplace(top, (count, key))
+    if writer is not None:
+        writer.close()
+    return [(count, *split_pair_key(key))
+            for count, key in sorted(top, reverse=True)]
+
+
+# Returns the integer encoded nconst -> primaryName map of the given artists
+def artist_names(connection, nconst_ids, int_keys=False):
+    nconsts = list(nconst_ids) if int_keys else [decode_nconst(nconst_id) for nconst_id in nconst_ids]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nconst, primaryName FROM Artist WHERE nconst = ANY(%s)",
+                       (nconsts,))
+        return {encode_nconst(nconst): name for nconst, name in cursor.fetchall()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Count artist collaborations (Query 4) with bounded memory.")
+    parser.add_argument('--top', type=int, default=5,
+                        help="number of top collaborations to print")
+    parser.add_argument('--max-pairs', type=int, default=DEFAULT_MAX_PAIRS,
+                        help="distinct pairs kept in memory before spilling to disk")
+    parser.add_argument('--itersize', type=int, default=DEFAULT_ITERSIZE,
+                        help="rows fetched per round trip from the server-side cursor")
+    parser.add_argument('--spill-dir', default=None,
+                        help="directory for spilled runs (defaults to the system temp dir)")
+    parser.add_argument('--write-table', action='store_true',
+                        help="write all pair counts to the collaboration_counts table")
+    parser.add_argument('--int-keys', action='store_true',
+                        help="the database was loaded with load_data__postgres.py --int-keys")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    connection = psycopg2.connect(**db_params)
+    counter = SpillingPairCounter(args.max_pairs, args.spill_dir)
+    try:
+        count_collaborations(connection, counter, args.itersize)
+        top = top_collaborations(connection, counter, args.top, args.write_table,
+                                 args.int_keys)
+        names = artist_names(connection, {nconst for _, *pair in top for nconst in pair},
+                             args.int_keys)
+        print("\nMost Frequent Collaborations Between Artists:")
+        for count, nconst_1, nconst_2 in top:
+            print((names.get(nconst_1, decode_nconst(nconst_1)),
+                   names.get(nconst_2, decode_nconst(nconst_2)), count))
+    finally:
+        counter.close()
+        connection.close()
+    print(f"\nTime taken: {(time.time() - start_time) / 60:.2f} minutes.")
@@ -1,7 +1,18 @@
 import pymongo
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+import argparse
+import contextlib
 import csv
+import os
+import sys
 import time
 
+# The resumable TSV reader and checkpoints are shared with the Phase 1 loader
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'phase1'))
+from resumable_tsv import Checkpoints, read_tsv_rows
+
 # Increase the field size limit to handle large fields
 csv.field_size_limit(10**7)
 """
@@ -16,14 +27,81 @@ Phase 2
 client = pymongo.MongoClient("mongodb://localhost:27017/")
 db = client["movie_dataset"]
 
-# Load Artists into MongoDB
-def load_artists(tsv_file):
-    collection = db["artists"]
+# Set in __main__; records the byte offset of the last inserted row per file
+checkpoints = None
+
+DEFAULT_CHECKPOINT_DIR = 'checkpoints/mongo'
+
+# Documents per insert_many call
+DEFAULT_BATCH_SIZE = 1000
+
+
+# Returns the byte offset and row number to resume a collection from, or
+# None when its checkpoint says it is already loaded
+def resume_position(name):
+    if checkpoints is None:
+        return None, 0
+    offset, row_num, done = checkpoints.position(name)
+    if done:
+        print(f"Skipping {name}: already loaded according to its checkpoint.")
+        return None
+    return offset, row_num
+
+
+def save_checkpoint(name, offset, row_num, done=False):
+    if checkpoints is not None:
+        checkpoints.save(name, offset, row_num, done)
+
+
+# Writes (document, offset, row_num) triples into a collection with
+# unordered insert_many calls of batch_size documents, checkpointing after
+# every batch, and reports the throughput in documents/sec
+def write_documents(name, documents, batch_size=DEFAULT_BATCH_SIZE,
+                    write_concern=None):
+    collection = db[name]
+    if write_concern is not None:
+        collection = collection.with_options(write_concern=write_concern)
     start_time = time.time()
-    with open(tsv_file, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter='\t')
-        next(reader)  # Skip the header
-        for row_num, row in enumerate(reader, start=1):
+    batch = []
+    inserted = 0
+    failed = 0
+    offset = row_num = None
+
+    def flush():
+        nonlocal batch, inserted, failed
+        if not batch:
+            return
+        try:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            # Unordered inserts keep going past failing documents
+            inserted += e.details['nInserted']
+            failed += len(e.details['writeErrors'])
+            for error in e.details['writeErrors']:
+                print(f"Error inserting into {name}: {error['errmsg']}")
+        batch = []
+        save_checkpoint(name, offset, row_num)
+
+    for document, offset, row_num in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    save_checkpoint(name, None, None, done=True)
+    elapsed_seconds = time.time() - start_time
+    documents_per_second = inserted / elapsed_seconds if elapsed_seconds else 0
+    print(f"Completed loading {name}. Time taken: {elapsed_seconds / 60:.2f} minutes "
+          f"({inserted} documents, {failed} failed, {documents_per_second:.0f} documents/sec).")
+
+# Load Artists into MongoDB
+def load_artists(tsv_file, batch_size=DEFAULT_BATCH_SIZE, write_concern=None):
+    position = resume_position("artists")
+    if position is None:
+        return
+    resume_offset, first_row = position
+
+    def documents(f):
+        for row_num, row, offset in read_tsv_rows(f, resume_offset, first_row=first_row):
             document = {
                 "nconst": row[0],
                 "primaryName": row[1],
@@ -32,78 +110,165 @@ def load_artists(tsv_file):
                 "primaryProfession": row[4].split(",") if row[4] != "\\N" else [],
                 "knownForTitles": row[5].split(",") if row[5] != "\\N" else []
             }
-            collection.insert_one(document)
-    elapsed_minutes = (time.time() - start_time) / 60
-    print(f"Completed loading artists. Time taken: {elapsed_minutes:.2f} minutes.")
+            yield document, offset, row_num
+
+    with open(tsv_file, 'rb') as f:
+        write_documents("artists", documents(f), batch_size, write_concern)
 
 # Load Titles into MongoDB
-def load_titles(tsv_file, ratings_file, akas_file):
-    collection = db["titles"]
-    # Load Ratings into a Dictionary
-    ratings = {}
-    with open(ratings_file, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter='\t')
-        next(reader)
-        for row in reader:
-            ratings[row[0]] = {"averageRating": float(row[1]), "numVotes": int(row[2])}
-
-    # Load Akas file data into a Dictionary
-    akas = {}
-    with open(akas_file, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter='\t')
-        next(reader)
-        for row in reader:
-            tconst = row[0]
-            aka = {
-                "ordering": int(row[1]),
-                "title": row[2],
-                "region": row[3] if row[3] != "\\N" else None,
-                "language": row[4] if row[4] != "\\N" else None,
-                "types": row[5] if row[5] != "\\N" else None,
-                "attributes": row[6] if row[6] != "\\N" else None,
-                "isOriginalTitle": bool(int(row[7])) if row[7] != "\\N" else False
-            }
-            if tconst not in akas:
-                akas[tconst] = []
-            akas[tconst].append(aka)
+def rating_document(row):
+    return {"averageRating": float(row[1]), "numVotes": int(row[2])}
 
-    # Load Titles into MongoDB
-    start_time = time.time()
-    with open(tsv_file, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter='\t')
-        next(reader)
-        for row_num, row in enumerate(reader, start=1):
-            # Ensure the row has at least 9 elements to account for data
-            # inconsistencies
-            if len(row) < 9:
-                print(f"Skipping row {row_num}: Row has fewer than 9 columns.")
-                continue
-            document = {
-                "tconst": row[0],
-                "titleType": row[1],
-                "primaryTitle": row[2],
-                "originalTitle": row[3],
-                "isAdult": bool(int(row[4])) if row[4] != "\\N" else False,
-                "startYear": int(row[5]) if row[5] != "\\N" else None,
-                "endYear": int(row[6]) if row[6] != "\\N" else None,
-                "runtimeMinutes": int(row[7]) if row[7] != "\\N" else None,
-                "genres": row[8].split(",") if row[8] != "\\N" else [],
-                "averageRating": ratings.get(row[0], {}).get("averageRating"),
-                "numVotes": ratings.get(row[0], {}).get("numVotes"),
-                "localizations": akas.get(row[0], [])
-            }
-            collection.insert_one(document)
-    elapsed_minutes = (time.time() - start_time) / 60
-    print(f"Completed loading titles. Time taken: {elapsed_minutes:.2f} minutes.")
+
+def aka_document(row):
+    return {
+        "ordering": int(row[1]),
+        "title": row[2],
+        "region": row[3] if row[3] != "\\N" else None,
+        "language": row[4] if row[4] != "\\N" else None,
+        "types": row[5] if row[5] != "\\N" else None,
+        "attributes": row[6] if row[6] != "\\N" else None,
+        "isOriginalTitle": bool(int(row[7])) if row[7] != "\\N" else False
+    }
+
+
+# Sort key matching the numeric order of IMDb identifiers in the TSV files
+# (tt9999999 sorts before tt10000000)
+def imdb_id_key(identifier):
+    return len(identifier), identifier
+
+
+# Yields (key, rows) for each run of consecutive rows sharing the first
+# column, raising ValueError if the file is not sorted by that column
+def group_rows_by_key(f):
+    key, group = None, []
+    for row_num, row, _ in read_tsv_rows(f):
+        if row[0] != key:
+            if key is not None:
+                if imdb_id_key(row[0]) < imdb_id_key(key):
+                    raise ValueError(
+                        f"{f.name} is not sorted by its first column at row {row_num}; "
+                        f"load titles without --streaming-titles")
+                yield key, group
+            key, group = row[0], []
+        group.append(row)
+    if key is not None:
+        yield key, group
+
+
+# Merge-join cursor over grouped rows: take(key) skips groups with smaller
+# keys and returns the rows for key, so only one group is held in memory
+class SortedGroups:
+    def __init__(self, groups):
+        self.groups = groups
+        self.head = next(groups, None)
+
+    def take(self, key):
+        while self.head is not None and imdb_id_key(self.head[0]) < imdb_id_key(key):
+            self.head = next(self.groups, None)
+        if self.head is None or self.head[0] != key:
+            return []
+        rows = self.head[1]
+        self.head = next(self.groups, None)
+        return rows
+
+
+# Load Titles into MongoDB. By default ratings and akas are loaded into
+# dictionaries first; with streaming=True the three files, which IMDb sorts
+# by tconst, are walked in step and each title is emitted as soon as its
+# ratings and localizations have been read.
+def load_titles(tsv_file, ratings_file, akas_file,
+                batch_size=DEFAULT_BATCH_SIZE, write_concern=None,
+                streaming=False):
+    position = resume_position("titles")
+    if position is None:
+        return
+    resume_offset, first_row = position
+
+    with contextlib.ExitStack() as stack:
+        if streaming:
+            ratings = SortedGroups(group_rows_by_key(
+                stack.enter_context(open(ratings_file, 'rb'))))
+            akas = SortedGroups(group_rows_by_key(
+                stack.enter_context(open(akas_file, 'rb'))))
+
+            def find_rating(tconst):
+                rows = ratings.take(tconst)
+                return rating_document(rows[0]) if rows else {}
+
+            def find_localizations(tconst):
+                return [aka_document(row) for row in akas.take(tconst)]
+        else:
+            # Load Ratings into a Dictionary
+            ratings = {}
+            with open(ratings_file, 'r', encoding='utf-8') as f:
+                reader = csv.reader(f, delimiter='\t')
+                next(reader)
+                for row in reader:
+                    ratings[row[0]] = rating_document(row)
+
+            # Load Akas file data into a Dictionary
+            akas = {}
+            with open(akas_file, 'r', encoding='utf-8') as f:
+                reader = csv.reader(f, delimiter='\t')
+                next(reader)
+                for row in reader:
+                    tconst = row[0]
+                    if tconst not in akas:
+                        akas[tconst] = []
+                    akas[tconst].append(aka_document(row))
+
+            def find_rating(tconst):
+                return ratings.get(tconst, {})
+
+            def find_localizations(tconst):
+                return akas.get(tconst, [])
+
+        # Load Titles into MongoDB
+        def documents(f):
+            previous_tconst = None
+            for row_num, row, offset in read_tsv_rows(f, resume_offset, first_row=first_row):
+                # Ensure the row has at least 9 elements to account for data
+                # inconsistencies
+                if len(row) < 9:
+                    print(f"Skipping row {row_num}: Row has fewer than 9 columns.")
+                    continue
+                if streaming and previous_tconst is not None and \
+                        imdb_id_key(row[0]) < imdb_id_key(previous_tconst):
+                    raise ValueError(
+                        f"{tsv_file} is not sorted by tconst at row {row_num}; "
+                        f"load titles without --streaming-titles")
+                previous_tconst = row[0]
+                rating = find_rating(row[0])
+                document = {
+                    "tconst": row[0],
+                    "titleType": row[1],
+                    "primaryTitle": row[2],
+                    "originalTitle": row[3],
+                    "isAdult": bool(int(row[4])) if row[4] != "\\N" else False,
+                    "startYear": int(row[5]) if row[5] != "\\N" else None,
+                    "endYear": int(row[6]) if row[6] != "\\N" else None,
+                    "runtimeMinutes": int(row[7]) if row[7] != "\\N" else None,
+                    "genres": row[8].split(",") if row[8] != "\\N" else [],
+                    "averageRating": rating.get("averageRating"),
+                    "numVotes": rating.get("numVotes"),
+                    "localizations": find_localizations(row[0])
+                }
+                yield document, offset, row_num
+
+        with open(tsv_file, 'rb') as f:
+            write_documents("titles", documents(f), batch_size, write_concern)
 
 # Load Principals into MongoDB
-def load_principals(tsv_file):
-    collection = db["principals"]
-    start_time = time.time()
-    with open(tsv_file, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter='\t')
-        next(reader)
-        for row_num, row in enumerate(reader, start=1):
+def load_principals(tsv_file, batch_size=DEFAULT_BATCH_SIZE,
+                    write_concern=None):
+    position = resume_position("principals")
+    if position is None:
+        return
+    resume_offset, first_row = position
+
+    def documents(f):
+        for row_num, row, offset in read_tsv_rows(f, resume_offset, first_row=first_row):
             document = {
                 "tconst": row[0],
                 "ordering": int(row[1]),
@@ -112,11 +277,179 @@ def load_principals(tsv_file):
                 "job": row[4] if row[4] != "\\N" else None,
                 "characters": row[5].strip("[]").split(",") if row[5] != "\\N" else []
             }
-            collection.insert_one(document)
+            yield document, offset, row_num
+
+    with open(tsv_file, 'rb') as f:
+        write_documents("principals", documents(f), batch_size, write_concern)
+
+
+# Upper bound on embedded cast/crew and filmography entries per document, so
+# prolific artists stay far below the 16 MB document limit
+DEFAULT_EMBED_CAP = 100
+
+
+# Returns an aggregation expression that looks up field of the document in
+# the looked-up array whose key equals the current entry's key
+def lookup_field(array, key, entry_key, field):
+    return {"$let": {
+        "vars": {"match": {"$arrayElemAt": [
+            {"$filter": {"input": array,
+                         "cond": {"$eq": [f"$$this.{key}", entry_key]}}}, 0]}},
+        "in": f"$$match.{field}"}}
+
+
+# Embeds a compact, capped principals array (nconst, category, ordering and
+# the denormalized primaryName) into each titles document. The grouping and
+# the join run server-side (MongoDB 5.0+) and are written back with $merge.
+def embed_principals(cap=DEFAULT_EMBED_CAP):
+    if resume_position("embed_principals") is None:
+        return
+    start_time = time.time()
+    db["principals"].create_index([("tconst", 1), ("ordering", 1)],
+                                  name="idx_principals_tconst_ordering")
+    db["titles"].create_index("tconst", unique=True, name="idx_titles_tconst")
+    db["artists"].create_index("nconst", unique=True, name="idx_artists_nconst")
+    pipeline = [
+        {"$sort": {"tconst": 1, "ordering": 1}},
+        {"$group": {"_id": "$tconst", "principals": {"$push": {
+            "nconst": "$nconst", "category": "$category",
+            "ordering": "$ordering"}}}},
+        {"$project": {"principals": {"$slice": ["$principals", cap]}}},
+        {"$lookup": {"from": "artists", "localField": "principals.nconst",
+                     "foreignField": "nconst", "as": "artists",
+                     "pipeline": [{"$project": {"_id": 0, "nconst": 1,
+                                                "primaryName": 1}}]}},
+        {"$project": {"_id": 0, "tconst": "$_id", "principals": {"$map": {
+            "input": "$principals", "as": "principal", "in": {
+                "nconst": "$$principal.nconst",
+                "category": "$$principal.category",
+                "ordering": "$$principal.ordering",
+                "primaryName": lookup_field("$artists", "nconst",
+                                            "$$principal.nconst",
+                                            "primaryName")}}}}},
+        {"$merge": {"into": "titles", "on": "tconst",
+                    "whenMatched": "merge", "whenNotMatched": "discard"}},
+    ]
+    list(db["principals"].aggregate(pipeline, allowDiskUse=True))
+    save_checkpoint("embed_principals", None, None, done=True)
+    elapsed_minutes = (time.time() - start_time) / 60
+    print(f"Embedded principals into titles. Time taken: {elapsed_minutes:.2f} minutes.")
+
+
+# Embeds the reverse, capped filmography array (tconst, category and the
+# denormalized primaryTitle and startYear) into each artists document
+def embed_filmography(cap=DEFAULT_EMBED_CAP):
+    if resume_position("embed_filmography") is None:
+        return
+    start_time = time.time()
+    db["principals"].create_index([("nconst", 1), ("tconst", 1)],
+                                  name="idx_principals_nconst_tconst")
+    db["titles"].create_index("tconst", unique=True, name="idx_titles_tconst")
+    db["artists"].create_index("nconst", unique=True, name="idx_artists_nconst")
+    pipeline = [
+        {"$sort": {"nconst": 1, "tconst": 1}},
+        {"$group": {"_id": "$nconst", "filmography": {"$push": {
+            "tconst": "$tconst", "category": "$category"}}}},
+        {"$project": {"filmography": {"$slice": ["$filmography", cap]}}},
+        {"$lookup": {"from": "titles", "localField": "filmography.tconst",
+                     "foreignField": "tconst", "as": "titles",
+                     "pipeline": [{"$project": {"_id": 0, "tconst": 1,
+                                                "primaryTitle": 1,
+                                                "startYear": 1}}]}},
+        {"$project": {"_id": 0, "nconst": "$_id", "filmography": {"$map": {
+            "input": "$filmography", "as": "credit", "in": {
+                "tconst": "$$credit.tconst",
+                "category": "$$credit.category",
+                "primaryTitle": lookup_field("$titles", "tconst",
+                                             "$$credit.tconst",
+                                             "primaryTitle"),
+                "startYear": lookup_field("$titles", "tconst",
+                                          "$$credit.tconst", "startYear")}}}}},
+        {"$merge": {"into": "artists", "on": "nconst",
+                    "whenMatched": "merge", "whenNotMatched": "discard"}},
+    ]
+    list(db["principals"].aggregate(pipeline, allowDiskUse=True))
+    save_checkpoint("embed_filmography", None, None, done=True)
     elapsed_minutes = (time.time() - start_time) / 60
-    print(f"Completed loading principals. Time taken: {elapsed_minutes:.2f} minutes.")
+    print(f"Embedded filmographies into artists. Time taken: {elapsed_minutes:.2f} minutes.")
+
+
+# Times "who worked on this title" for a random sample of titles, once with
+# a $lookup from the principals collection and once from the embedded array
+def compare_read_paths(sample_size=1000):
+    tconsts = [document["tconst"] for document in db["titles"].aggregate([
+        {"$match": {"principals": {"$exists": True}}},
+        {"$sample": {"size": sample_size}},
+        {"$project": {"tconst": 1}}])]
+    if not tconsts:
+        print("No titles with embedded principals to compare.")
+        return
+
+    start_time = time.time()
+    for tconst in tconsts:
+        list(db["principals"].aggregate([
+            {"$match": {"tconst": tconst}},
+            {"$lookup": {"from": "artists", "localField": "nconst",
+                         "foreignField": "nconst", "as": "artist"}},
+            {"$project": {"nconst": 1, "category": 1, "ordering": 1,
+                          "artist.primaryName": 1}}]))
+    lookup_seconds = time.time() - start_time
+
+    start_time = time.time()
+    for tconst in tconsts:
+        db["titles"].find_one({"tconst": tconst}, {"principals": 1})
+    embedded_seconds = time.time() - start_time
+
+    print(f"Cast/crew reads for {len(tconsts)} titles:")
+    print(f" - $lookup on principals: {lookup_seconds:.4f} seconds")
+    print(f" - Embedded array:        {embedded_seconds:.4f} seconds")
+    if embedded_seconds < lookup_seconds:
+        improvement = lookup_seconds - embedded_seconds
+        print(f" - Improvement: {improvement:.4f} seconds ({improvement / lookup_seconds * 100:.2f}% faster)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load the IMDb TSV files into the Phase 2 MongoDB collections.")
+    parser.add_argument('--checkpoint-dir', default=DEFAULT_CHECKPOINT_DIR,
+                        help="directory holding the per-collection checkpoints")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted load from its checkpoints")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="documents per insert_many call")
+    parser.add_argument('--write-concern', default='1',
+                        help="write concern w value, e.g. 0, 1 or majority")
+    parser.add_argument('--journal', action='store_true',
+                        help="wait for inserts to be journaled")
+    parser.add_argument('--streaming-titles', action='store_true',
+                        help="merge-join title.basics, title.ratings and "
+                             "title.akas in tconst order instead of loading "
+                             "ratings and akas into memory first")
+    parser.add_argument('--embed', action='store_true',
+                        help="after loading, embed capped principals arrays "
+                             "into titles and filmography arrays into artists")
+    parser.add_argument('--embed-cap', type=int, default=DEFAULT_EMBED_CAP,
+                        help="maximum embedded entries per document")
+    parser.add_argument('--compare-reads', type=int, default=0, metavar='N',
+                        help="time cast/crew reads for N sample titles with "
+                             "$lookup and with the embedded array")
+    args = parser.parse_args()
+
+    checkpoints = Checkpoints(args.checkpoint_dir)
+    if not args.resume:
+        checkpoints.clear()
+    w = int(args.write_concern) if args.write_concern.isdigit() else args.write_concern
+    write_concern = WriteConcern(w=w, j=args.journal or None)
+
+    # Load Collections
+    load_artists('data/name.basics.tsv', args.batch_size, write_concern)
+    load_titles('data/title.basics.tsv', 'data/title.ratings.tsv', 'data/title.akas.tsv',
+                args.batch_size, write_concern, args.streaming_titles)
+    load_principals('data/title.principals.tsv', args.batch_size, write_concern)
+
+    if args.embed:
+        embed_principals(args.embed_cap)
+        embed_filmography(args.embed_cap)
+    if args.compare_reads:
+        compare_read_paths(args.compare_reads)
 
-# Load Collections
-load_artists('data/name.basics.tsv')
-load_titles('data/title.basics.tsv', 'data/title.ratings.tsv', 'data/title.akas.tsv')
-load_principals('data/title.principals.tsv')
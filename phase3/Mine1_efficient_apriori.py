@@ -1,8 +1,11 @@
 import psycopg2
 import pandas as pd
-from efficient_apriori import apriori
-from collections import defaultdict
-import sys
+from efficient_apriori.itemsets import itemsets_from_transactions
+from transaction_baskets import expand_baskets
+import bitmap_itemsets
+import fpgrowth_itemsets
+from functools import partial
+import argparse
 import os
 
 # Database connection parameters
@@ -14,31 +17,53 @@ db_params = {
     'port': 5432
 }
 
-def fetch_profession_data(cursor):
+# Rows fetched per round trip from the server-side cursor
+DEFAULT_ITERSIZE = 10000
+
+def apriori_itemsets(baskets, min_support, max_length):
+    # efficient_apriori only takes plain transactions, so every basket is
+    # repeated as many times as its weight
+    return itemsets_from_transactions(expand_baskets(baskets), min_support=min_support,
+                                      max_length=max_length)
+
+# Frequent itemset engines over (basket, weight) pairs. All return the same
+# {k: {itemset: count}} dictionary in the same order, so the CSV files do not
+# depend on the engine.
+engines = {
+    'apriori': apriori_itemsets,  # efficient_apriori
+    'bitmap': bitmap_itemsets.weighted_frequent_itemsets,  # bitset intersections, see bitmap_itemsets.py
+    'fpgrowth': fpgrowth_itemsets.weighted_frequent_itemsets,  # FP-tree, see fpgrowth_itemsets.py
+}
+
+def fetch_profession_data(conn, itersize=DEFAULT_ITERSIZE):
     """
-    Fetches profession data from the PostgreSQL database.
+    Fetches profession data from the PostgreSQL database, grouped into
+    distinct profession sets by the server.
 
     Returns:
-        List of transactions, where each transaction is a list of professions associated with an artist.
+        List of (basket, weight) pairs, where each basket is a tuple of the professions
+        associated with an artist and weight is the number of artists with exactly those professions.
     """
     try:
-        # Fetch professions for each artist from artist_profession table
+        # Collect the professions of every artist into a sorted array and count
+        # the artists of each distinct array, so only the distinct baskets
+        # reach Python
         query = """
-            SELECT ap.nconst, ap.label
-            FROM artist_profession ap
-            WHERE ap.label IS NOT NULL;
+            SELECT professions, COUNT(*)
+            FROM (
+                SELECT array_agg(DISTINCT ap.label ORDER BY ap.label) AS professions
+                FROM artist_profession ap
+                WHERE ap.label IS NOT NULL
+                GROUP BY ap.nconst
+            ) AS artist_professions
+            GROUP BY professions
+            ORDER BY professions;
         """
-        cursor.execute(query)
-        records = cursor.fetchall()
-
-        # Organize data into a dictionary with nconst as keys and list of professions as values
-        transactions = defaultdict(list)
-        for nconst, label in records:
-            transactions[nconst].append(label)
-
-        # Convert the dictionary to a list of profession lists
-        transaction_list = list(transactions.values())
-        return transaction_list
+        # Stream the baskets through a named (server-side) cursor
+        with conn.cursor(name='profession_baskets') as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query)
+            return [(tuple(basket), weight) for basket, weight in cursor]
 
     except psycopg2.Error as e:
         print("An error occurred while fetching profession data:")
@@ -88,24 +113,24 @@ def save_itemsets_to_csv(itemsets, k, total_transactions, dataset='professions')
     df.to_csv(filename, index=False)
     print(f"Frequent {k}-itemsets saved to '{filename}' ({len(subset)} itemsets).")
 
-def main():
+def main(engine='apriori', workers=1, itersize=DEFAULT_ITERSIZE):
     try:
         # Connect to the PostgreSQL database
         conn = psycopg2.connect(**db_params)
-        cursor = conn.cursor()
         print("Connected to the database successfully.\n")
 
         # Fetch profession transactions
         print("Fetching profession data...")
-        transactions = fetch_profession_data(cursor)
-        total_transactions = len(transactions)
+        baskets = fetch_profession_data(conn, itersize)
+        total_transactions = sum(weight for _, weight in baskets)
         print(f"Number of transactions (artists): {total_transactions}")
-        if transactions:
-            print(f"Sample transaction: {transactions[0]}\n")
+        print(f"Number of distinct profession sets: {len(baskets)}")
+        if baskets:
+            print(f"Sample transaction: {list(baskets[0][0])}\n")
         else:
             print("No transactions found.\n")
 
-        if not transactions:
+        if not baskets:
             print("No data available to perform Apriori analysis. Exiting.")
             return
 
@@ -126,11 +151,16 @@ def main():
             os.makedirs(output_dir)
         os.chdir(output_dir)
 
+        # Find the frequent itemsets of all levels at once with the chosen engine.
+        # The levels are built bottom up, so level k is the same as with
+        # max_length=k, and no association rules are needed.
+        mine = engines[engine]
+        if engine == 'fpgrowth':
+            mine = partial(mine, workers=workers)
+        itemsets, _ = mine(baskets, min_support=min_support, max_length=max_k)
+
         while current_k <= max_k:
             print(f"Processing L{current_k}_professions...")
-            # Apply Apriori algorithm using efficient_apriori
-            # For higher k, set max_length to current_k
-            itemsets, _ = apriori(transactions, min_support=min_support, min_confidence=0.0, max_length=current_k)
 
             # Check if there are any frequent itemsets of size k
             if current_k not in itemsets or not itemsets[current_k]:
@@ -145,8 +175,7 @@ def main():
 
         print("\nApriori analysis for professions completed.")
 
-        # Close the cursor and connection
-        cursor.close()
+        # Close the connection
         conn.close()
         print("\nDatabase connection closed.")
 
@@ -160,4 +189,12 @@ def main():
         print(ex)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Mine frequent itemsets from the database.")
+    parser.add_argument('--engine', choices=sorted(engines), default='apriori',
+                        help="frequent itemset engine (default: apriori)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes mining the conditional FP-trees (fpgrowth engine only)")
+    parser.add_argument('--itersize', type=int, default=DEFAULT_ITERSIZE,
+                        help="rows fetched per round trip from the server-side cursor")
+    args = parser.parse_args()
+    main(args.engine, args.workers, args.itersize)
@@ -1,8 +1,11 @@
 import psycopg2
 import pandas as pd
-from efficient_apriori import apriori
-from collections import defaultdict
-import sys
+from efficient_apriori.itemsets import itemsets_from_transactions
+from transaction_baskets import expand_baskets
+import bitmap_itemsets
+import fpgrowth_itemsets
+from functools import partial
+import argparse
 import os
 
 # Database connection parameters
@@ -14,32 +17,54 @@ db_params = {
     'port': 5432
 }
 
-def fetch_genre_data(cursor):
+# Rows fetched per round trip from the server-side cursor
+DEFAULT_ITERSIZE = 10000
+
+def apriori_itemsets(baskets, min_support, max_length):
+    # efficient_apriori only takes plain transactions, so every basket is
+    # repeated as many times as its weight
+    return itemsets_from_transactions(expand_baskets(baskets), min_support=min_support,
+                                      max_length=max_length)
+
+# Frequent itemset engines over (basket, weight) pairs. All return the same
+# {k: {itemset: count}} dictionary in the same order, so the CSV files do not
+# depend on the engine.
+engines = {
+    'apriori': apriori_itemsets,  # efficient_apriori
+    'bitmap': bitmap_itemsets.weighted_frequent_itemsets,  # bitset intersections, see bitmap_itemsets.py
+    'fpgrowth': fpgrowth_itemsets.weighted_frequent_itemsets,  # FP-tree, see fpgrowth_itemsets.py
+}
+
+def fetch_genre_data(conn, itersize=DEFAULT_ITERSIZE):
     """
-    Fetches genre data from the PostgreSQL database.
+    Fetches genre data from the PostgreSQL database, grouped into
+    distinct genre sets by the server.
 
     Returns:
-        List of transactions, where each transaction is a list of genres associated with a title.
+        List of (basket, weight) pairs, where each basket is a tuple of the genres
+        associated with a title and weight is the number of titles with exactly those genres.
     """
     try:
-        # Fetch genres for each title from title_genre and genre tables
+        # Collect the genres of every title into a sorted array and count
+        # the titles of each distinct array, so only the distinct baskets
+        # reach Python
         query = """
-            SELECT tg.tconst, g.genrename
-            FROM title_genre tg
-            JOIN genre g ON tg.genreid = g.genreid
-            WHERE g.genrename IS NOT NULL;
+            SELECT genres, COUNT(*)
+            FROM (
+                SELECT array_agg(DISTINCT g.genrename ORDER BY g.genrename) AS genres
+                FROM title_genre tg
+                JOIN genre g ON tg.genreid = g.genreid
+                WHERE g.genrename IS NOT NULL
+                GROUP BY tg.tconst
+            ) AS title_genres
+            GROUP BY genres
+            ORDER BY genres;
         """
-        cursor.execute(query)
-        records = cursor.fetchall()
-
-        # Organize data into a dictionary with tconst as keys and list of genres as values
-        transactions = defaultdict(list)
-        for tconst, genrename in records:
-            transactions[tconst].append(genrename)
-
-        # Convert the dictionary to a list of genre lists
-        transaction_list = list(transactions.values())
-        return transaction_list
+        # Stream the baskets through a named (server-side) cursor
+        with conn.cursor(name='genre_baskets') as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query)
+            return [(tuple(basket), weight) for basket, weight in cursor]
 
     except psycopg2.Error as e:
         print("An error occurred while fetching genre data:")
@@ -89,24 +114,24 @@ def save_itemsets_to_csv(itemsets, k, total_transactions, dataset='genres'):
     df.to_csv(filename, index=False)
     print(f"Frequent {k}-itemsets saved to '{filename}' ({len(subset)} itemsets).")
 
-def main():
+def main(engine='apriori', workers=1, itersize=DEFAULT_ITERSIZE):
     try:
         # Connect to the PostgreSQL database
         conn = psycopg2.connect(**db_params)
-        cursor = conn.cursor()
         print("Connected to the database successfully.\n")
 
         # Fetch genre transactions
         print("Fetching genre data...")
-        transactions = fetch_genre_data(cursor)
-        total_transactions = len(transactions)
+        baskets = fetch_genre_data(conn, itersize)
+        total_transactions = sum(weight for _, weight in baskets)
         print(f"Number of transactions (titles): {total_transactions}")
-        if transactions:
-            print(f"Sample transaction: {transactions[0]}\n")
+        print(f"Number of distinct genre sets: {len(baskets)}")
+        if baskets:
+            print(f"Sample transaction: {list(baskets[0][0])}\n")
         else:
             print("No transactions found.\n")
 
-        if not transactions:
+        if not baskets:
             print("No data available to perform Apriori analysis. Exiting.")
             return
 
@@ -127,11 +152,16 @@ def main():
             os.makedirs(output_dir)
         os.chdir(output_dir)
 
+        # Find the frequent itemsets of all levels at once with the chosen engine.
+        # The levels are built bottom up, so level k is the same as with
+        # max_length=k, and no association rules are needed.
+        mine = engines[engine]
+        if engine == 'fpgrowth':
+            mine = partial(mine, workers=workers)
+        itemsets, _ = mine(baskets, min_support=min_support, max_length=max_k)
+
         while current_k <= max_k:
             print(f"Processing L{current_k}_genres...")
-            # Apply Apriori algorithm using efficient_apriori
-            # For higher k, set max_length to current_k
-            itemsets, _ = apriori(transactions, min_support=min_support, min_confidence=0.0, max_length=current_k)
 
             # Check if there are any frequent itemsets of size k
             if current_k not in itemsets or not itemsets[current_k]:
@@ -146,8 +176,7 @@ def main():
 
         print("\nApriori analysis for genres completed.")
 
-        # Close the cursor and connection
-        cursor.close()
+        # Close the connection
         conn.close()
         print("\nDatabase connection closed.")
 
@@ -161,4 +190,12 @@ def main():
         print(ex)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Mine frequent itemsets from the database.")
+    parser.add_argument('--engine', choices=sorted(engines), default='apriori',
+                        help="frequent itemset engine (default: apriori)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes mining the conditional FP-trees (fpgrowth engine only)")
+    parser.add_argument('--itersize', type=int, default=DEFAULT_ITERSIZE,
+                        help="rows fetched per round trip from the server-side cursor")
+    args = parser.parse_args()
+    main(args.engine, args.workers, args.itersize)
@@ -0,0 +1,167 @@
+import numpy as np
+from array import array
+from transaction_baskets import compress_transactions
+
+"""
+CSCI-620: Project Phase 3
+
+Vertical (Eclat-style) frequent itemset mining with bitsets. Every item is
+encoded as a bitset over the transactions, and the support of an itemset is
+the popcount of the AND of its items' bitsets. The item vocabularies of the
+Mine scripts are small (a few dozen professions or genres) while there are
+millions of transactions, so a handful of vectorized ANDs replace the
+repeated scans over Python sets done by efficient_apriori. Identical
+transactions are collapsed into weighted baskets first (see
+transaction_baskets.py), so the bitsets span the distinct baskets and a
+support is the weighted popcount of an AND.
+
+frequent_itemsets() is a drop-in replacement for
+efficient_apriori.itemsets.itemsets_from_transactions: it takes the same
+arguments and returns the same {k: {itemset: count}} dictionary, in the same
+order, so the CSV files written from it are identical.
+
+"""
+
+# Number of set bits of every byte value, for NumPy versions without
+# np.bitwise_count
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)],
+                    dtype=np.uint8)
+
+
+def popcount(bitsets):
+    """
+    Counts the set bits of each row of a 2-D array of packed bitsets.
+    """
+    if hasattr(np, 'bitwise_count'):
+        # Rows are padded to whole 64-bit words by encode_baskets
+        return np.bitwise_count(bitsets.view(np.uint64)).sum(axis=-1, dtype=np.int64)
+    return POPCOUNT[bitsets].sum(axis=-1, dtype=np.int64)
+
+
+def weighted_popcount(bitsets, weight_planes):
+    """
+    Sums the weights of the baskets set in each row of a 2-D array of packed
+    bitsets, one popcount per bit of the weights.
+    """
+    counts = np.zeros(len(bitsets), dtype=np.int64)
+    for bit, plane in enumerate(weight_planes):
+        counts += popcount(bitsets & plane) << bit
+    return counts
+
+
+def encode_baskets(baskets):
+    """
+    Encodes weighted baskets as one bitset per item.
+
+    Args:
+        baskets (iterable): (basket, weight) pairs, each basket an iterable of hashable items.
+
+    Returns:
+        Tuple of the items in order of first appearance, a uint8 array with the
+        packed bitset of every item (bit i is set when basket i contains the
+        item), the weight planes (packed bitsets of the baskets whose weight
+        has bit b set, for every bit b) and the total weight.
+    """
+    item_ids = {}
+    item_column = array('I')
+    basket_column = array('Q')
+    weights = array('q')
+    for basket, weight in baskets:
+        for item in basket:
+            item_column.append(item_ids.setdefault(item, len(item_ids)))
+            basket_column.append(len(weights))
+        weights.append(weight)
+
+    rows = np.frombuffer(item_column, dtype=np.uint32)
+    positions = np.frombuffer(basket_column, dtype=np.uint64)
+    weights = np.frombuffer(weights, dtype=np.int64)
+    # Rows are padded to whole 64-bit words, with the padding bits unset
+    width = (len(weights) + 63) // 64 * 8
+    bitsets = np.zeros((len(item_ids), width), dtype=np.uint8)
+    # Same bit order as np.packbits: basket 0 is the high bit of byte 0.
+    # Repeated items of a basket set the same bit again.
+    np.bitwise_or.at(bitsets, (rows, positions // 8),
+                     (np.uint8(0x80) >> (positions % 8).astype(np.uint8)))
+
+    weight_planes = np.zeros((int(weights.max(initial=0)).bit_length(), width), dtype=np.uint8)
+    for bit in range(len(weight_planes)):
+        packed = np.packbits((weights >> bit) & 1)
+        weight_planes[bit, :len(packed)] = packed
+    return list(item_ids), bitsets, weight_planes, int(weights.sum())
+
+
+def frequent_itemsets(transactions, min_support, max_length=8):
+    """
+    Finds the frequent itemsets of the transactions by depth-first extension
+    of sorted prefixes, intersecting their bitsets.
+
+    Args:
+        transactions (iterable): Transactions, each an iterable of hashable items.
+        min_support (float): Minimum fraction of transactions an itemset must appear in.
+        max_length (int): Maximum size of the itemsets.
+
+    Returns:
+        Tuple of a dictionary mapping each size k to the frequent k-itemsets
+        (sorted tuples) and their counts, and the number of transactions.
+        Like efficient_apriori, 1-itemsets are in order of first appearance
+        and larger itemsets in sorted order.
+    """
+    return weighted_frequent_itemsets(compress_transactions(transactions).items(),
+                                      min_support, max_length)
+
+
+def weighted_frequent_itemsets(baskets, min_support, max_length=8):
+    """
+    Finds the frequent itemsets of weighted baskets, where a basket of weight
+    w counts as w identical transactions.
+
+    Args:
+        baskets (iterable): (basket, weight) pairs, each basket an iterable of hashable items.
+        min_support (float): Minimum fraction of the total weight an itemset must appear in.
+        max_length (int): Maximum size of the itemsets.
+
+    Returns:
+        Tuple of a dictionary mapping each size k to the frequent k-itemsets
+        (sorted tuples) and their weighted counts, and the total weight.
+        1-itemsets are in order of first appearance and larger itemsets in
+        sorted order.
+    """
+    if not (0 <= min_support <= 1):
+        raise ValueError("`min_support` must be a number between 0 and 1.")
+
+    items, bitsets, weight_planes, transaction_count = encode_baskets(baskets)
+    if transaction_count == 0:
+        return dict(), 0
+
+    counts = weighted_popcount(bitsets, weight_planes)
+    # Same test as efficient_apriori, so rounding cannot make them disagree
+    frequent = counts / transaction_count >= min_support
+    if not frequent.any():
+        return dict(), 0
+
+    itemsets = {1: {(items[index],): int(counts[index])
+                    for index in np.flatnonzero(frequent)}}
+
+    def extend(prefix, extension_items, extension_bitsets, extension_counts):
+        # extension_items are sorted and prefix + (item,) is frequent for each
+        for index, item in enumerate(extension_items):
+            itemset = prefix + (item,)
+            if len(itemset) > 1:
+                itemsets.setdefault(len(itemset), {})[itemset] = int(extension_counts[index])
+            if len(itemset) >= max_length or index + 1 == len(extension_items):
+                continue
+            joined = extension_bitsets[index + 1:] & extension_bitsets[index]
+            joined_counts = weighted_popcount(joined, weight_planes)
+            keep = np.flatnonzero(joined_counts / transaction_count >= min_support)
+            if len(keep):
+                extend(itemset,
+                       [extension_items[index + 1 + position] for position in keep],
+                       joined[keep], joined_counts[keep])
+
+    order = sorted(np.flatnonzero(frequent), key=lambda index: items[index])
+    extend((), [items[index] for index in order], bitsets[order], counts[order])
+
+    # efficient_apriori lists the itemsets of each size k > 1 in sorted order
+    for k in range(2, len(itemsets) + 1):
+        itemsets[k] = dict(sorted(itemsets[k].items()))
+    return itemsets, transaction_count
@@ -1,29 +1,248 @@
 import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
 import os
+import shutil
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Byte-range helpers shared with the Phase 1 loader
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'phase1'))
+from resumable_tsv import ByteRangeFile, split_byte_ranges
+
+# Rows per chunk in the streaming mode
+DEFAULT_CHUNKSIZE = 1000000
+
+# Part of the fingerprint of every cleaned file. Increase it when a change
+# to the cleaning code changes the output, so that all files are recleaned.
+CLEANING_VERSION = 1
+
+MANIFEST_FILE = 'manifest.json'
+
+# pandas' default missing value markers plus the IMDb null marker
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN',
+             '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN',
+             'None', 'n/a', 'nan', 'null', '\\N']
+
+# Extra first column holding the number of fields of each raw line
+FIELD_COUNT_COLUMN = '_fields'
+
+
+# Vectorized column conversions. Values that cannot be converted become
+# missing values.
+def to_int(column):
+    numbers = pd.to_numeric(column, errors='coerce')
+    return numbers.where(numbers % 1 == 0).astype('Int64')
+
+
+def to_float(column):
+    return pd.to_numeric(column, errors='coerce')
+
+
+def to_bool(column):
+    numbers = pd.to_numeric(column, errors='coerce')
+    return (numbers != 0).astype('boolean').mask(numbers.isna())
+
+
+# Comma separated values to lists, with an empty list for missing values
+def to_list(column):
+    lists = column.str.split(',')
+    return lists.where(lists.notna(),
+                       pd.Series([[]] * len(lists), index=lists.index,
+                                 dtype=object))
+
+
+JSON_LIST_SEPARATOR = ' | '
+
+
+def parse_json_list(value):
+    try:
+        items = json.loads(value)
+    except ValueError:
+        return None
+    if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+        return None
+    return JSON_LIST_SEPARATOR.join(items)
+
+
+# JSON arrays of strings such as ["Self","Host"], joined with ' | '. Arrays
+# without escapes or embedded quotes are split with string operations and
+# only the remaining values go through json.loads. Malformed values become
+# missing values and are reported.
+def to_json_list(column):
+    inner = column.str[2:-2]
+    simple = (column.str.startswith('["') & column.str.endswith('"]')
+              & (column.str.len() >= 4)
+              & ~column.str.contains('\\', regex=False)
+              & ~inner.str.replace('","', '', regex=False).str.contains('"', regex=False))
+    simple = simple.fillna(False).astype(bool)
+    result = inner.str.replace('","', JSON_LIST_SEPARATOR, regex=False).astype(object)
+    result = result.where(simple, None)
+    rest = column.notna() & ~simple
+    if rest.any():
+        parsed = column[rest].map(parse_json_list)
+        result[rest] = parsed
+        malformed = column[rest][parsed.isna()]
+        if len(malformed):
+            print(f"{len(malformed)} malformed JSON arrays in column {column.name}, "
+                  f"e.g. {malformed.head(3).tolist()}")
+    return result
+
+
+# Transformation names accepted by clean_tsv
+converters = {
+    'int': to_int,
+    'float': to_float,
+    'bool': to_bool,
+    'list': to_list,
+    'json_list': to_json_list,
+}
+
+
+# Parquet column types of the named transformations. Other columns,
+# including those of callable transformations, are stored as strings.
+def arrow_schema(column_names, transformations):
+    import pyarrow as pa  # Only needed for Parquet output
+    types = {
+        'int': pa.int64(),
+        'float': pa.float64(),
+        'bool': pa.bool_(),
+        'list': pa.list_(pa.string()),
+    }
+    return pa.schema([(column, types.get(transformations.get(column), pa.string()))
+                      for column in column_names])
+
+
+def to_arrow(df, schema):
+    import pyarrow as pa
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def write_parquet(df, output_path, schema):
+    import pyarrow.parquet as pq
+    pq.write_table(to_arrow(df, schema), output_path, compression='zstd')
+
+
+# Binary file object that prefixes every non-empty line of source with its
+# number of tab-separated fields, read by pandas as FIELD_COUNT_COLUMN. Rows
+# with missing fields and rows whose last fields are empty look the same once
+# parsed, so the raw field count is what tells them apart.
+class FieldCountReader(io.RawIOBase):
+    def __init__(self, source, block_size=1 << 20):
+        self.source = source
+        self.block_size = block_size
+        self.rest = b''  # Incomplete last line of the blocks read so far
+        self.output = b''
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def fill(self):
+        block = self.source.read(self.block_size)
+        if block:
+            lines = (self.rest + block).split(b'\n')
+            self.rest = lines.pop()
+        elif self.rest:  # Last line without a newline
+            lines, self.rest = [self.rest], b''
+        else:
+            return False
+        self.output = b''.join(b'%d\t%s\n' % (line.count(b'\t') + 1, line)
+                               for line in lines if line)
+        self.position = 0
+        return True
+
+    def readinto(self, buffer):
+        while self.position == len(self.output):
+            if not self.fill():
+                return 0
+        data = self.output[self.position:self.position + len(buffer)]
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def close(self):
+        self.source.close()
+        super().close()
+
+
+# read_csv options shared by the whole-file and streaming modes, for a
+# source opened with open_source. Rows with more fields than column_names are
+# skipped by the parser or, when it reads in chunks, by clean_frame.
+def read_options(column_names, header=True):
+    return dict(sep='\t', header=0 if header else None,
+                names=[FIELD_COUNT_COLUMN] + column_names,
+                dtype={FIELD_COUNT_COLUMN: 'int64',
+                       **{column: str for column in column_names}},
+                keep_default_na=False, na_values=NA_VALUES,
+                on_bad_lines='warn')
+
+
+# Opens what read_csv reads: the whole file, or only the lines that start
+# inside byte_range (start, end), with the field count of every line (see
+# FieldCountReader). Only the range starting at 0 holds the header row.
+def open_source(file_path, byte_range=None):
+    if byte_range is None:
+        source = open(file_path, 'rb')
+    else:
+        source = ByteRangeFile(file_path, *byte_range)
+    return io.BufferedReader(FieldCountReader(source))
+
+
+def has_header(byte_range):
+    return byte_range is None or not byte_range[0]
+
+
+# Drops the rows with a wrong number of fields and applies the
+# transformations. A transformation is either one of the names in converters
+# or a function applied to each value, which receives None for missing values.
+def clean_frame(df, file_name, expected_columns, transformations):
+    # Ensure rows have the correct number of columns
+    bad_rows = df[FIELD_COUNT_COLUMN] != expected_columns
+    if bad_rows.any():
+        print(f"Skipping {bad_rows.sum()} rows of {file_name} "
+              f"without exactly {expected_columns} columns.")
+        df = df[~bad_rows]
+    df = df.drop(columns=FIELD_COUNT_COLUMN)
+
+    # Apply transformations to each column
+    for column, transform in transformations.items():
+        if column not in df.columns:
+            continue
+        if transform in converters:
+            df[column] = converters[transform](df[column])
+            continue
+        values = df[column].astype(object)
+        try:
+            df[column] = values.where(values.notna(), None).apply(transform)
+        except ValueError as e:
+            print(f"ValueError for column {column}: {e}")
+    return df
 
 
 # Cleans a TSV file by ensuring the correct number of columns, replacing
 # missing values, applying transformations, and removing duplicates.
 def clean_tsv(file_path, expected_columns, column_names, transformations,
-              unique_identifier=None):
+              unique_identifier=None, byte_range=None):
     try:
         # Load the TSV file
-        df = pd.read_csv(file_path, sep='\t', dtype=str, header=0)
-
-        # Ensure rows have the correct number of columns
-        df = df[df.apply(lambda x: len(x) == expected_columns, axis=1)]
-        df.columns = column_names  # Assign column names
-
-        # Replace missing values
-        df.replace('\\N', None, inplace=True)
-
-        # Apply transformations to each column
-        for column, transform_func in transformations.items():
-            if column in df.columns:
-                try:
-                    df[column] = df[column].apply(transform_func)
-                except ValueError as e:
-                    print(f"ValueError for column {column}: {e}")
+        with open_source(file_path, byte_range) as source:
+            df = pd.read_csv(source, **read_options(column_names,
+                                                    has_header(byte_range)))
+        df = clean_frame(df, os.path.basename(file_path), expected_columns,
+                         transformations)
 
         # Remove duplicates
         if unique_identifier:
@@ -37,111 +256,458 @@ def clean_tsv(file_path, expected_columns, column_names, transformations,
     return df
 
 
-# Cleans all data files and saves cleaned versions.
-def clean_all_datasets():
-    data_dir = "data"  # Directory with input files
-    output_dir = "cleaned_data"  # Directory for cleaned files
-    os.makedirs(output_dir, exist_ok=True)
+# Returns the mask of the first occurrences of the hashes that are not in
+# seen, a sorted array, and seen with those hashes merged in. The chunk's
+# hashes are sorted once, so looking them up in seen is a sequential scan and
+# the merge copies seen only once, so the cost of a chunk stays flat as seen
+# grows instead of re-sorting every hash written so far.
+def first_unseen(seen, hashes):
+    unique, first = np.unique(hashes, return_index=True)
+    positions = np.searchsorted(seen, unique)
+    new = np.ones(len(unique), dtype=bool)
+    inside = positions < len(seen)
+    new[inside] = seen[positions[inside]] != unique[inside]
+    keep = np.zeros(len(hashes), dtype=bool)
+    keep[first[new]] = True
+    return keep, np.insert(seen, positions[new], unique[new])
+
+
+# Streaming version of clean_tsv for files larger than memory. The file is
+# cleaned chunksize rows at a time and every chunk is appended to
+# output_path. Duplicates across chunks are found through a sorted array of
+# the 64-bit hashes of the unique_identifier columns already written, which
+# keeps the first occurrence like drop_duplicates. With the parquet format
+# every chunk becomes a row group. Returns the number of rows written.
+def clean_tsv_chunked(file_path, output_path, expected_columns, column_names,
+                      transformations, unique_identifier=None,
+                      chunksize=DEFAULT_CHUNKSIZE, output_format='tsv',
+                      byte_range=None):
+    rows = 0
+    seen = np.empty(0, dtype=np.uint64)
+    writer = None
+    try:
+        schema = (arrow_schema(column_names, transformations)
+                  if output_format == 'parquet' else None)
+        with open_source(file_path, byte_range) as source:
+            chunks = pd.read_csv(source, chunksize=chunksize,
+                                 **read_options(column_names,
+                                                has_header(byte_range)))
+            for number, chunk in enumerate(chunks):
+                chunk = clean_frame(chunk, os.path.basename(file_path),
+                                    expected_columns, transformations)
+
+                # Remove duplicates within the chunk and of earlier chunks
+                if unique_identifier:
+                    hashes = pd.util.hash_pandas_object(
+                        chunk[unique_identifier], index=False).to_numpy()
+                    keep, seen = first_unseen(seen, hashes)
+                    chunk = chunk[keep]
+
+                if output_format == 'parquet':
+                    table = to_arrow(chunk, schema)
+                    if writer is None:
+                        import pyarrow.parquet as pq
+                        # The table's schema, unlike arrow_schema, carries the
+                        # pandas metadata that restores the nullable dtypes
+                        # when the file is read back
+                        writer = pq.ParquetWriter(output_path, table.schema,
+                                                  compression='zstd')
+                    writer.write_table(table)
+                else:
+                    chunk.to_csv(output_path, sep='\t', index=False,
+                                 mode='w' if number == 0 else 'a',
+                                 header=number == 0)
+                rows += len(chunk)
+
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+
+    print(f"Cleaned {os.path.basename(file_path)} in chunks of {chunksize}: {rows} rows.")
+    return rows
 
-    # Clean title.akas.tsv
-    clean_title_akas = clean_tsv(
-        file_path=os.path.join(data_dir, "title.akas.tsv"),
-        expected_columns=8,
-        column_names=["titleId", "ordering", "title", "region", "language",
-                      "types", "attributes", "isOriginalTitle"],
-        transformations={
-            "ordering": lambda x: int(x) if x is not None else None,
-            "isOriginalTitle": lambda x: bool(
-                int(x)) if x is not None else None,
+
+# Input file, output file and clean_tsv arguments of every dataset
+datasets = [
+    {
+        "input": "title.akas.tsv",
+        "output": "title.akas.cleaned.tsv",
+        "expected_columns": 8,
+        "column_names": ["titleId", "ordering", "title", "region", "language",
+                         "types", "attributes", "isOriginalTitle"],
+        "transformations": {
+            "ordering": 'int',
+            "isOriginalTitle": 'bool',
+        },
+        "unique_identifier": ["titleId", "ordering"],
+    },
+    {
+        "input": "title.basics.tsv",
+        "output": "title.basics.cleaned.tsv",
+        "expected_columns": 9,
+        "column_names": ["tconst", "titleType", "primaryTitle", "originalTitle",
+                         "isAdult", "startYear", "endYear", "runtimeMinutes",
+                         "genres"],
+        "transformations": {
+            "isAdult": 'bool',
+            "startYear": 'int',
+            "endYear": 'int',
+            # invalid (non-numeric) values become missing values
+            "runtimeMinutes": 'int',
+            "genres": 'list',
         },
-        unique_identifier=["titleId", "ordering"]
-    )
-    if clean_title_akas is not None:
-        clean_title_akas.to_csv(
-            os.path.join(output_dir, "title.akas.cleaned.tsv"), sep='\t',
-            index=False)
-
-    # Clean title.basics.tsv
-    clean_title_basics = clean_tsv(
-        file_path=os.path.join(data_dir, "title.basics.tsv"),
-        expected_columns=9,
-        column_names=["tconst", "titleType", "primaryTitle", "originalTitle",
-                      "isAdult", "startYear", "endYear", "runtimeMinutes",
-                      "genres"],
-        transformations={
-            "isAdult": lambda x: bool(int(x)) if x is not None else None,
-            "startYear": lambda x: int(x) if x is not None else None,
-            "endYear": lambda x: int(x) if x is not None else None,
-            # check if the value is numeric to account for invalid data
-            "runtimeMinutes": lambda x: int(
-                x) if x is not None and x.isdigit() else None,
-            # check type to account for invalid data
-            "genres": lambda x: x.split(',') if isinstance(x, str) else [],
+        "unique_identifier": ["tconst"],
+    },
+    {
+        "input": "title.principals.tsv",
+        "output": "title.principals.cleaned.tsv",
+        "expected_columns": 6,
+        "column_names": ["tconst", "ordering", "nconst", "category", "job",
+                         "characters"],
+        "transformations": {
+            "ordering": 'int',
+            "characters": 'json_list',
         },
-        unique_identifier=["tconst"]
-    )
-    if clean_title_basics is not None:
-        clean_title_basics.to_csv(
-            os.path.join(output_dir, "title.basics.cleaned.tsv"), sep='\t',
-            index=False)
-
-    # Clean title.principals.tsv
-    clean_title_principals = clean_tsv(
-        file_path=os.path.join(data_dir, "title.principals.tsv"),
-        expected_columns=6,
-        column_names=["tconst", "ordering", "nconst", "category", "job",
-                      "characters"],
-        transformations={
-            "ordering": lambda x: int(x) if x is not None else None,
-            "characters": lambda x: " | ".join(eval(x)) if x and x.startswith(
-                '[') else None,
-            "job": lambda x: x if x and x != "\\N" else None,
-        }
-    )
-
-    if clean_title_principals is not None:
-        clean_title_principals.to_csv(
-            os.path.join(output_dir, "title.principals.cleaned.tsv"), sep='\t',
-            index=False
-        )
-
-    # Clean title.ratings.tsv
-    clean_title_ratings = clean_tsv(
-        file_path=os.path.join(data_dir, "title.ratings.tsv"),
-        expected_columns=3,
-        column_names=["tconst", "averageRating", "numVotes"],
-        transformations={
-            "averageRating": lambda x: float(x) if x is not None else None,
-            "numVotes": lambda x: int(x) if x is not None else None,
+    },
+    {
+        "input": "title.ratings.tsv",
+        "output": "title.rating.cleaned.tsv",
+        "expected_columns": 3,
+        "column_names": ["tconst", "averageRating", "numVotes"],
+        "transformations": {
+            "averageRating": 'float',
+            "numVotes": 'int',
         },
-        unique_identifier=["tconst"]
-    )
-    if clean_title_ratings is not None:
-        clean_title_ratings.to_csv(
-            os.path.join(output_dir, "title.rating.cleaned.tsv"), sep='\t',
-            index=False)
-
-    # Clean name.basics.tsv
-    clean_name_basics = clean_tsv(
-        file_path=os.path.join(data_dir, "name.basics.tsv"),
-        expected_columns=6,
-        column_names=["nconst", "primaryName", "birthYear", "deathYear",
-                      "primaryProfession", "knownForTitles"],
-        transformations={
-            "birthYear": lambda x: int(x) if x is not None else None,
-            "deathYear": lambda x: int(x) if x is not None else None,
-            "primaryProfession": lambda x: x.split(
-                ',') if x is not None else [],
-            "knownForTitles": lambda x: x.split(',') if x is not None else [],
+        "unique_identifier": ["tconst"],
+    },
+    {
+        "input": "name.basics.tsv",
+        "output": "name.basics.cleaned.tsv",
+        "expected_columns": 6,
+        "column_names": ["nconst", "primaryName", "birthYear", "deathYear",
+                         "primaryProfession", "knownForTitles"],
+        "transformations": {
+            "birthYear": 'int',
+            "deathYear": 'int',
+            "primaryProfession": 'list',
+            "knownForTitles": 'list',
         },
-        unique_identifier=["nconst"]
-    )
-    if clean_name_basics is not None:
-        clean_name_basics.to_csv(
-            os.path.join(output_dir, "name.basics.cleaned.tsv"), sep='\t',
-            index=False)
+        "unique_identifier": ["nconst"],
+    },
+]
+
+
+# Path of the cleaned file of a dataset, with .parquet instead of .tsv for
+# Parquet output
+def output_path_of(dataset, output_dir, output_format='tsv'):
+    output_path = os.path.join(output_dir, dataset["output"])
+    if output_format == 'parquet':
+        output_path = os.path.splitext(output_path)[0] + '.parquet'
+    return output_path
+
+
+# Cleans one dataset and saves the cleaned version as TSV or as Parquet,
+# streaming it in chunks when chunksize is given. With a byte_range only the
+# lines inside it are cleaned, into the given output_path. Returns whether
+# the cleaned file was written.
+def clean_dataset(dataset, data_dir, output_dir, chunksize=None,
+                  output_format='tsv', byte_range=None, output_path=None):
+    options = {key: value for key, value in dataset.items()
+               if key not in ("input", "output")}
+    file_path = os.path.join(data_dir, dataset["input"])
+    output_path = output_path or output_path_of(dataset, output_dir,
+                                                output_format)
+    if chunksize:
+        rows = clean_tsv_chunked(file_path, output_path, chunksize=chunksize,
+                                 output_format=output_format,
+                                 byte_range=byte_range, **options)
+        return rows is not None
+    cleaned = clean_tsv(file_path, byte_range=byte_range, **options)
+    if cleaned is None:
+        return False
+    if output_format == 'parquet':
+        write_parquet(cleaned, output_path,
+                      arrow_schema(options["column_names"],
+                                   options["transformations"]))
+    else:
+        cleaned.to_csv(output_path, sep='\t', index=False)
+    return True
+
+
+# Runs clean_dataset in a pool worker and returns whether it succeeded, the
+# wall time and the peak memory of the worker process (ru_maxrss, in
+# kilobytes on Linux). Workers only clean one file or range each, so the
+# peak belongs to that task.
+def clean_worker(index, data_dir, output_dir, chunksize, output_format,
+                 byte_range=None, output_path=None):
+    start_time = time.time()
+    cleaned = clean_dataset(datasets[index], data_dir, output_dir, chunksize,
+                            output_format, byte_range, output_path)
+    peak_memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                   if resource is not None else None)
+    return cleaned, time.time() - start_time, peak_memory
+
+
+# Stand-in for ProcessPoolExecutor(max_tasks_per_child=1) on Python < 3.11:
+# every task runs in its own single-worker executor, and at most max_workers
+# of them run at once
+class FreshProcessPool:
+    def __init__(self, max_workers, mp_context):
+        self.slots = threading.BoundedSemaphore(max_workers)
+        self.mp_context = mp_context
+        self.executors = []
+
+    def submit(self, fn, *args):
+        self.slots.acquire()
+        executor = ProcessPoolExecutor(max_workers=1, mp_context=self.mp_context)
+        future = executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        # The worker process exits once the task is done
+        executor.shutdown(wait=False)
+        self.executors.append(executor)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for executor in self.executors:
+            executor.shutdown()
+
+
+# Pool in which every task runs in a fresh process, so its peak memory can
+# be reported
+def fresh_process_pool(workers):
+    context = multiprocessing.get_context('spawn')
+    if sys.version_info >= (3, 11):
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                   max_tasks_per_child=1)
+    return FreshProcessPool(workers, context)
+
+
+# Concatenates the cleaned parts of a split dataset in range order and
+# removes them. Parts of ranges without any rows may be missing.
+def merge_parts(part_paths, output_path, output_format='tsv'):
+    part_paths = [path for path in part_paths if os.path.exists(path)]
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+        writer = None
+        for path in part_paths:
+            part = pq.ParquetFile(path)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, part.schema_arrow,
+                                          compression='zstd')
+            for group in range(part.num_row_groups):
+                writer.write_table(part.read_row_group(group))
+        if writer is not None:
+            writer.close()
+    else:
+        with open(output_path, 'wb') as output:
+            for number, path in enumerate(part_paths):
+                with open(path, 'rb') as part:
+                    if number > 0:
+                        part.readline()  # Only keep the first header row
+                    shutil.copyfileobj(part, output)
+    for path in part_paths:
+        os.remove(path)
+
+
+# Cleans the datasets with the given indexes in a pool of worker processes.
+# The files of datasets without a unique_identifier are split into
+# split_chunks byte ranges that are cleaned concurrently and concatenated
+# afterwards; datasets that drop duplicates are cleaned as a whole. Returns
+# the indexes of the datasets that were cleaned successfully.
+def clean_datasets_parallel(indexes, data_dir, output_dir, workers,
+                            chunksize=None, output_format='tsv',
+                            split_chunks=1):
+    start_time = time.time()
+    tasks = []  # (dataset index, byte range, part path)
+    split_outputs = {}  # dataset index -> (output path, part paths)
+    failed = set()
+    for index in indexes:
+        dataset = datasets[index]
+        output_path = output_path_of(dataset, output_dir, output_format)
+        if split_chunks > 1 and not dataset.get("unique_identifier"):
+            ranges = split_byte_ranges(os.path.join(data_dir, dataset["input"]),
+                                       split_chunks)
+            parts = [f"{output_path}.part{number}" for number in range(len(ranges))]
+            split_outputs[index] = (output_path, parts)
+            tasks.extend(zip([index] * len(ranges), ranges, parts))
+        else:
+            tasks.append((index, None, None))
+
+    with fresh_process_pool(workers) as pool:
+        futures = {pool.submit(clean_worker, index, data_dir, output_dir,
+                               chunksize, output_format, byte_range,
+                               part_path): (index, byte_range)
+                   for index, byte_range, part_path in tasks}
+        for future in as_completed(futures):
+            index, byte_range = futures[future]
+            cleaned, seconds, peak_memory = future.result()
+            if not cleaned:
+                failed.add(index)
+            name = datasets[index]["input"]
+            if byte_range is not None:
+                name += f" (bytes {byte_range[0]}-{byte_range[1]})"
+            memory = (f", peak memory {peak_memory / 1024:.0f} MB"
+                      if peak_memory is not None else "")
+            print(f"Finished {name}: {seconds:.2f} seconds{memory}.")
+
+    for index, (output_path, parts) in split_outputs.items():
+        if index in failed:
+            for path in parts:
+                if os.path.exists(path):
+                    os.remove(path)
+        else:
+            merge_parts(parts, output_path, output_format)
+    print(f"Cleaned {len(indexes) - len(failed)} datasets with {workers} workers. "
+          f"Time taken: {time.time() - start_time:.2f} seconds.")
+    return [index for index in indexes if index not in failed]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Hash of everything besides the input file that determines the cleaned
+# output. chunksize and the worker settings are left out because they do not
+# change the output.
+def params_fingerprint(dataset, output_format):
+    def describe(transform):
+        if callable(transform):
+            return f"{transform.__module__}.{transform.__qualname__}"
+        return transform
+
+    params = dict(dataset, transformations={
+        column: describe(transform)
+        for column, transform in dataset["transformations"].items()})
+    return hashlib.sha256(json.dumps(
+        {"version": CLEANING_VERSION, "format": output_format,
+         "dataset": params}, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# Size, modification time and SHA-256 of an input file
+def input_state(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(path)}
+
+
+# Manifest of the cleaned files in the output directory: for every output
+# file the state of the input file it was cleaned from, the parameter
+# fingerprint and the output size. A file is only cleaned again when one of
+# them changed.
+class Manifest:
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def is_current(self, input_path, output_path, fingerprint):
+        entry = self.entries.get(os.path.basename(output_path))
+        if entry is None or entry["params"] != fingerprint:
+            return False
+        if (not os.path.exists(output_path)
+                or os.path.getsize(output_path) != entry["output_size"]):
+            return False
+        stat = os.stat(input_path)
+        if stat.st_size != entry["input"]["size"]:
+            return False
+        if stat.st_mtime_ns == entry["input"]["mtime_ns"]:
+            return True
+        # Touched (e.g. downloaded again) but possibly unchanged
+        if file_sha256(input_path) != entry["input"]["sha256"]:
+            return False
+        entry["input"]["mtime_ns"] = stat.st_mtime_ns
+        return True
+
+    def record(self, output_path, state, fingerprint):
+        self.entries[os.path.basename(output_path)] = {
+            "input": state, "params": fingerprint,
+            "output_size": os.path.getsize(output_path)}
+
+    # Written to a temporary file first so a crash never leaves a truncated
+    # manifest behind
+    def save(self):
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(self.path + '.tmp', self.path)
+
+
+# Cleans all data files whose cleaned version is missing or out of date and
+# saves cleaned versions. With force every file is cleaned.
+def clean_all_datasets(chunksize=None, output_format='tsv', workers=1,
+                       split_chunks=1, force=False):
+    data_dir = "data"  # Directory with input files
+    output_dir = "cleaned_data"  # Directory for cleaned files
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = Manifest(output_dir)
+    pending = {}  # dataset index -> (output path, input state, fingerprint)
+    for index, dataset in enumerate(datasets):
+        input_path = os.path.join(data_dir, dataset["input"])
+        output_path = output_path_of(dataset, output_dir, output_format)
+        fingerprint = params_fingerprint(dataset, output_format)
+        try:
+            if not force and manifest.is_current(input_path, output_path,
+                                                 fingerprint):
+                print(f"Skipping {dataset['input']}: unchanged since it was last cleaned.")
+                continue
+            # Taken before cleaning so that a file replaced while it is being
+            # cleaned is cleaned again on the next run
+            state = input_state(input_path)
+        except OSError as e:
+            # e.g. a run with only some of the input files downloaded
+            print(f"Error processing {input_path}: {e}")
+            continue
+        pending[index] = (output_path, state, fingerprint)
+    manifest.save()  # Keep refreshed modification times
+
+    if workers > 1 and pending:
+        cleaned = clean_datasets_parallel(list(pending), data_dir, output_dir,
+                                          workers, chunksize, output_format,
+                                          split_chunks)
+    else:
+        cleaned = [index for index in pending
+                   if clean_dataset(datasets[index], data_dir, output_dir,
+                                    chunksize, output_format)]
+
+    for index in cleaned:
+        manifest.record(*pending[index])
+    manifest.save()
 
     print(f"All datasets cleaned and saved to {output_dir}")
 
 
-clean_all_datasets()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Clean the IMDb TSV files in data/ into cleaned_data/.")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="stream each file in chunks of this many rows "
+                             "instead of loading it into memory at once")
+    parser.add_argument('--format', choices=['tsv', 'parquet'], default='tsv',
+                        help="output format; parquet (requires pyarrow) keeps "
+                             "list, integer and boolean column types")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of files (or file ranges) cleaned in "
+                             "parallel worker processes")
+    parser.add_argument('--split-chunks', type=int, default=1,
+                        help="with --workers, byte ranges per file for the "
+                             "datasets that are not deduplicated")
+    parser.add_argument('--force', action='store_true',
+                        help="clean every file, even if the manifest shows "
+                             "that its cleaned version is up to date")
+    args = parser.parse_args()
+
+    clean_all_datasets(args.chunksize, args.format, args.workers,
+                       args.split_chunks, args.force)
@@ -0,0 +1,197 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+import multiprocessing
+from transaction_baskets import compress_transactions
+
+"""
+CSCI-620: Project Phase 3
+
+FP-Growth frequent itemset mining. The transactions are inserted into a
+prefix tree (FP-tree) in a single pass, and the frequent itemsets are found
+by recursively mining the conditional trees of each item instead of
+generating and counting candidates level by level, which is what makes
+efficient_apriori slow at a low absolute support. The conditional trees of
+the items of the first tree are independent, so they can be mined by a pool
+of worker processes. Identical transactions are collapsed into weighted
+baskets first (see transaction_baskets.py) and each basket is inserted once
+with its weight.
+
+frequent_itemsets() is a drop-in replacement for
+efficient_apriori.itemsets.itemsets_from_transactions: it takes the same
+arguments and returns the same {k: {itemset: count}} dictionary, in the same
+order, so the CSV files written from it are identical.
+
+"""
+
+
+class FPNode:
+    __slots__ = ('item', 'count', 'parent', 'children')
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+
+
+# Prefix tree of transactions with a header table linking the nodes of
+# every item
+class FPTree:
+    def __init__(self):
+        self.root = FPNode(None, None)
+        self.nodes = defaultdict(list)
+        self.counts = defaultdict(int)
+
+    # Inserts a transaction whose items are in the tree's item order
+    def add(self, items, weight=1):
+        node = self.root
+        for item in items:
+            child = node.children.get(item)
+            if child is None:
+                child = node.children[item] = FPNode(item, node)
+                self.nodes[item].append(child)
+            child.count += weight
+            self.counts[item] += weight
+            node = child
+
+    # Conditional pattern base of an item: the path above each of its nodes,
+    # weighted by the node's count
+    def prefix_paths(self, item):
+        paths = []
+        for node in self.nodes[item]:
+            path = []
+            parent = node.parent
+            while parent.item is not None:
+                path.append(parent.item)
+                parent = parent.parent
+            if path:
+                paths.append((path, node.count))
+        return paths
+
+
+def mine_tree(tree, suffix, transaction_count, min_support, max_length):
+    """
+    Finds the frequent itemsets ending in suffix from a (conditional) FP-tree.
+
+    Returns:
+        Dictionary mapping each frequent itemset, a tuple of item ids with the
+        suffix last, to its count.
+    """
+    found = {}
+    for item, count in tree.counts.items():
+        # Same test as efficient_apriori, so rounding cannot make them disagree
+        if count / transaction_count < min_support:
+            continue
+        itemset = (item,) + suffix
+        found[itemset] = count
+        if len(itemset) < max_length:
+            found.update(mine_pattern_base(itemset, tree.prefix_paths(item),
+                                           transaction_count, min_support, max_length))
+    return found
+
+
+def mine_pattern_base(suffix, pattern_base, transaction_count, min_support, max_length):
+    """
+    Builds the conditional FP-tree of a pattern base and mines it. Runs in the
+    worker processes for the items of the first tree.
+    """
+    counts = defaultdict(int)
+    for path, weight in pattern_base:
+        for item in path:
+            counts[item] += weight
+    frequent = {item: count for item, count in counts.items()
+                if count / transaction_count >= min_support}
+    if not frequent:
+        return {}
+
+    # Most frequent items first, which keeps the conditional tree small
+    tree = FPTree()
+    for path, weight in pattern_base:
+        tree.add(sorted((item for item in path if item in frequent),
+                        key=lambda item: (-frequent[item], item)), weight)
+    return mine_tree(tree, suffix, transaction_count, min_support, max_length)
+
+
+def frequent_itemsets(transactions, min_support, max_length=8, workers=1):
+    """
+    Finds the frequent itemsets of the transactions with FP-Growth.
+
+    Args:
+        transactions (iterable): Transactions, each a collection of hashable items.
+            Read once, so it can be a generator.
+        min_support (float): Minimum fraction of transactions an itemset must appear in.
+        max_length (int): Maximum size of the itemsets.
+        workers (int): Number of processes mining the conditional trees.
+
+    Returns:
+        Tuple of a dictionary mapping each size k to the frequent k-itemsets
+        (sorted tuples) and their counts, and the number of transactions.
+        Like efficient_apriori, 1-itemsets are in order of first appearance
+        and larger itemsets in sorted order.
+    """
+    return weighted_frequent_itemsets(compress_transactions(transactions).items(),
+                                      min_support, max_length, workers)
+
+
+def weighted_frequent_itemsets(baskets, min_support, max_length=8, workers=1):
+    """
+    Finds the frequent itemsets of weighted baskets with FP-Growth, where a
+    basket of weight w counts as w identical transactions.
+
+    Args:
+        baskets (iterable): (basket, weight) pairs, each basket an iterable of hashable items.
+            Read once, so it can be a generator.
+        min_support (float): Minimum fraction of the total weight an itemset must appear in.
+        max_length (int): Maximum size of the itemsets.
+        workers (int): Number of processes mining the conditional trees.
+
+    Returns:
+        Tuple of a dictionary mapping each size k to the frequent k-itemsets
+        (sorted tuples) and their weighted counts, and the total weight.
+        1-itemsets are in order of first appearance and larger itemsets in
+        sorted order.
+    """
+    if not (0 <= min_support <= 1):
+        raise ValueError("`min_support` must be a number between 0 and 1.")
+
+    # Items are numbered in order of first appearance and inserted into the
+    # tree in that order, so the tree is built while the baskets stream by
+    # and needs no counting pass first
+    item_ids = {}
+    tree = FPTree()
+    transaction_count = 0
+    for basket, weight in baskets:
+        tree.add(sorted({item_ids.setdefault(item, len(item_ids)) for item in basket}), weight)
+        transaction_count += weight
+    if transaction_count == 0:
+        return dict(), 0
+
+    frequent = [item for item, count in tree.counts.items()
+                if count / transaction_count >= min_support]
+    if not frequent:
+        return dict(), 0
+
+    if workers > 1 and max_length > 1:
+        found = {(item,): tree.counts[item] for item in frequent}
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(mine_pattern_base, (item,), tree.prefix_paths(item),
+                                   transaction_count, min_support, max_length)
+                       for item in frequent]
+            for future in futures:
+                found.update(future.result())
+    else:
+        found = mine_tree(tree, (), transaction_count, min_support, max_length)
+
+    items = list(item_ids)
+    # Item ids follow first appearance, the order of efficient_apriori's 1-itemsets
+    itemsets = {1: {(items[item],): found[(item,)] for item in sorted(frequent)}}
+    larger = defaultdict(dict)
+    for itemset, count in found.items():
+        if len(itemset) > 1:
+            larger[len(itemset)][tuple(sorted(items[item] for item in itemset))] = count
+
+    # efficient_apriori lists the itemsets of each size k > 1 in sorted order
+    for k in sorted(larger):
+        itemsets[k] = dict(sorted(larger[k].items()))
+    return itemsets, transaction_count
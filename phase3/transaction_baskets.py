@@ -0,0 +1,47 @@
+"""
+CSCI-620: Project Phase 3
+
+Compression of the mining transactions into weighted baskets. Most artists
+share one of a few hundred profession sets and most titles one of a few
+thousand genre combinations, so collapsing identical transactions into
+(basket, weight) pairs lets the weighted engines in bitmap_itemsets.py and
+fpgrowth_itemsets.py scan the distinct baskets instead of every transaction.
+
+"""
+
+
+def compress_transactions(transactions):
+    """
+    Collapses identical transactions, ignoring item order and repeated items.
+
+    Args:
+        transactions (iterable): Transactions, each a collection of hashable items.
+
+    Returns:
+        Dictionary mapping each distinct basket to the number of transactions
+        it stands for. Baskets are kept in order of first appearance, with the
+        items of their first transaction in its order, so reading the baskets
+        meets the items in the same order as reading the transactions.
+    """
+    baskets = {}
+    for transaction in transactions:
+        key = frozenset(transaction)
+        basket = baskets.get(key)
+        if basket is None:
+            baskets[key] = [tuple(dict.fromkeys(transaction)), 1]
+        else:
+            basket[1] += 1
+    return {basket: weight for basket, weight in baskets.values()}
+
+
+def expand_baskets(baskets):
+    """
+    Yields every basket as many times as its weight, for engines that only
+    take plain transactions.
+
+    Args:
+        baskets (iterable): (basket, weight) pairs.
+    """
+    for basket, weight in baskets:
+        for _ in range(weight):
+            yield basket